@@ -1,7 +1,67 @@
+from django.apps import apps
 from django.contrib import admin
+from django.db import transaction
+
+from tracker.models import User, Intake, IntakeArchive, History, Rollup, Streak
+from tracker.purge import purge_counts, purge_users
+from tracker.stats import rebuild_stats
+
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    """
+    Exclusões passam por purge_users, que apaga o histórico em lotes
+    """
+
+    def get_deleted_objects(self, objs, request):
+        # A confirmação padrão listaria cada dia e consumo, carregando todos em memória
+        users = list(objs)
+        counts = {
+            apps.get_model(label)._meta.verbose_name_plural: count
+            for label, count in purge_counts([user.pk for user in users]).items()
+            if count
+        }
+        perms_needed = set() if self.has_delete_permission(request) else {User._meta.verbose_name}
+
+        return [str(user) for user in users], counts, perms_needed, []
+
+    def delete_model(self, request, obj):
+        purge_users([obj.pk])
+
+    def delete_queryset(self, request, queryset):
+        purge_users(queryset.values_list('pk', flat=True))
+
+
+@admin.register(Intake)
+class IntakeAdmin(admin.ModelAdmin):
+    """
+    Edições e exclusões atualizam os totais do dia e recalculam consolidados e sequência do usuário
+    """
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            users = {obj.history_id.user_id_id}
+            if change and 'history_id' in form.changed_data:
+                # Consumo movido para outro dia, possivelmente de outro usuário
+                users.add(History.objects.get(pk=form.initial['history_id']).user_id_id)
+
+            super().save_model(request, obj, form, change)
+            rebuild_stats(users)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            rebuild_stats([obj.history_id.user_id_id])
+
+    def delete_queryset(self, request, queryset):
+        # O delete() do queryset não mexeria nos totais dos dias
+        with transaction.atomic():
+            users = set(queryset.values_list('history_id__user_id', flat=True))
+            queryset.remove()
+            rebuild_stats(users)
 
-from tracker.models import User, Intake, History
 
-admin.site.register(User)
 admin.site.register(History)
-admin.site.register(Intake)
+admin.site.register(IntakeArchive)
+admin.site.register(Rollup)
+admin.site.register(Streak)
@@ -0,0 +1,303 @@
+"""
+Versões assíncronas dos endpoints mais acessados, usadas quando a API roda em ASGI
+
+O DRF não tem suporte a views assíncronas, então estas são views Django puras que
+reaproveitam os serializers e respondem no mesmo formato de UserViewSet
+"""
+
+import functools
+import json
+from zoneinfo import ZoneInfo
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, MethodNotAllowed, NotFound, ParseError
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+
+from tracker.buffer import buffer
+from tracker.cache import (
+    make_entry,
+    aget_resume,
+    aresume_version,
+    aset_resume,
+    aget_user_timezone,
+    aset_user_timezone,
+)
+from tracker.events import get_broker, publish_day, user_channel
+from tracker.export import aiterate
+from tracker.models import User, History, Intake
+from tracker.pagination import HistoryCursorPagination
+from tracker.representations import history_data, history_queryset, project
+from tracker.routers import read_from_replica
+from tracker.serializers import DrinkSerializer, DayTotalsSerializer
+from tracker.stats import record_intake
+from tracker.views import export_stream, parse_date_param, parse_summary_params
+
+
+def render(data, status_code=status.HTTP_200_OK, headers=None):
+    return JsonResponse(
+        data,
+        status=status_code,
+        headers=headers,
+        safe=False,
+        encoder=JSONEncoder,
+        json_dumps_params={"ensure_ascii": False, "separators": (",", ":")}
+    )
+
+
+def async_api(methods: list, replica: bool = False):
+    """
+    Restringe os métodos aceitos e converte as exceções do DRF na mesma resposta dos endpoints síncronos.
+    Com replica=True as leituras vão para a réplica, como nas replica_actions de UserViewSet
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise MethodNotAllowed(request.method)
+
+                with read_from_replica(replica):
+                    return await view(request, *args, **kwargs)
+            except APIException as exc:
+                data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+                return render(data, exc.status_code)
+
+        # Assim como as views do DRF, não depende do token CSRF
+        wrapper.csrf_exempt = True
+        return wrapper
+
+    return decorator
+
+
+async def get_user(pk) -> User:
+    try:
+        return await User.objects.aget(pk=pk)
+    except (User.DoesNotExist, ValueError):
+        raise NotFound()
+
+
+async def user_today(pk):
+    """
+    Mesmo que tracker.views.user_today
+    """
+
+    if (name := await aget_user_timezone(pk)) is None:
+        try:
+            with read_from_replica(False):
+                name = await User.objects.filter(pk=pk).values_list('timezone', flat=True).afirst()
+        except ValueError:
+            name = None
+
+        if name is None:
+            raise NotFound()
+
+        await aset_user_timezone(pk, name)
+
+    return timezone.localdate(timezone=ZoneInfo(name))
+
+
+def record_drink(user: User, data: dict) -> tuple:
+    """
+    Grava o consumo em uma única transação, com a linha do dia bloqueada, como UserViewSet.drink.
+    Retorna o consumo e o dia com os totais já incrementados
+    """
+
+    with transaction.atomic():
+        # get_or_create trata o conflito caso outra requisição crie o mesmo dia ao mesmo tempo
+        point_in_history, _ = History.objects.select_for_update().get_or_create(
+            user_id=user,
+            date=user.local_date(),
+            defaults={'goal': user.daily_goal}
+        )
+        intake = Intake.objects.create(history_id=point_in_history, **data)
+        record_intake(point_in_history, intake.quantity)
+        publish_day(user.pk, point_in_history.date)
+
+    # O banco foi atualizado via F() em Intake.save, aqui apenas refletimos na instância
+    point_in_history.amount_taken += intake.quantity
+    point_in_history.intake_count += 1
+
+    return intake, point_in_history
+
+
+@async_api(methods=["POST"])
+async def drink(request, pk):
+    """
+        Registra o consumo de água de um usuário. Mesmo contrato de UserViewSet.drink
+    """
+
+    try:
+        payload = json.loads(request.body or b"{}")
+    except ValueError:
+        raise ParseError()
+
+    intake_serializer = DrinkSerializer(data=payload)
+    intake_serializer.is_valid(raise_exception=True)
+
+    user = await get_user(pk)
+
+    if settings.TRACKER_WRITE_BEHIND:
+        date = user.local_date()
+        if key := buffer.enqueue(user.pk, date, intake_serializer.validated_data["quantity"]):
+            return render(
+                {
+                    "key": key,
+                    **intake_serializer.data,
+                    "resume": DayTotalsSerializer(await sync_to_async(buffer.day)(user, date)).data
+                },
+                status.HTTP_202_ACCEPTED
+            )
+
+    intake, point_in_history = await sync_to_async(record_drink)(user, intake_serializer.validated_data)
+
+    return render(
+        {
+            **DrinkSerializer(intake).data,
+            "resume": DayTotalsSerializer(point_in_history).data
+        },
+        status.HTTP_201_CREATED
+    )
+
+
+@async_api(methods=["GET"], replica=True)
+async def resume(request, pk):
+    """
+        Retorna o resumo do dia especificado. Mesmo contrato de UserViewSet.resume
+    """
+
+    date = parse_date_param(request.GET, "date") or await user_today(pk)
+    fields, intakes = parse_summary_params(request.GET)
+
+    if settings.TRACKER_WRITE_BEHIND and buffer.pending(pk)[1]:
+        await sync_to_async(buffer.flush)(pk)
+
+    if not (entry := await aget_resume(pk, date)):
+        # Como em UserViewSet.resume, o que vai para o cache é lido do banco principal
+        with read_from_replica(False):
+            user = await get_user(pk)
+            version = await aresume_version(user.pk, date)
+
+            queryset = History.objects.filter(user_id__exact=user.pk, date__exact=date)
+            if not (days := await sync_to_async(history_data)(history_queryset(queryset)[:1])):
+                raise NotFound(f"Dia '{date}' não existe no histórico do usuário")
+
+        entry = await aset_resume(user.pk, date, days[0], version)
+
+    if fields is not None:
+        entry = make_entry(project(entry["data"], fields, intakes))
+
+    etags = [etag.strip() for etag in request.headers.get("If-None-Match", "").split(",")]
+    if entry["etag"] in etags:
+        return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": entry["etag"]})
+
+    return render(entry["data"], headers={"ETag": entry["etag"]})
+
+
+@async_api(methods=["GET"], replica=True)
+async def history(request, pk):
+    """
+        Retorna o histórico paginado do usuário. Mesmo contrato de UserViewSet.history
+    """
+
+    user = await get_user(pk)
+
+    fields, intakes = parse_summary_params(request.GET)
+    queryset = History.objects.filter(user_id__exact=user.pk)
+
+    if since := parse_date_param(request.GET, "since"):
+        queryset = queryset.filter(date__gte=since)
+
+    if until := parse_date_param(request.GET, "until"):
+        queryset = queryset.filter(date__lte=until)
+
+    # A paginação do DRF é síncrona, então a página é lida em uma única chamada
+    paginator = HistoryCursorPagination()
+    rows = history_queryset(queryset, fields, intakes)
+    page = await sync_to_async(paginator.paginate_queryset)(rows, Request(request))
+
+    return render({
+        "next": paginator.get_next_link(),
+        "previous": paginator.get_previous_link(),
+        "results": await sync_to_async(history_data)(page, fields, intakes),
+    })
+
+
+@async_api(methods=["GET"])
+async def export(request, pk):
+    """
+        Exporta o histórico do usuário em streaming. Mesmo contrato de UserViewSet.export
+
+        O StreamingHttpResponse do Django leria um gerador síncrono inteiro em memória antes
+        de responder em ASGI, então os dias são enviados em lotes por aiterate
+    """
+
+    user = await get_user(pk)
+
+    output, content, content_type = export_stream(user.pk, request.GET)
+    response = StreamingHttpResponse(aiterate(content), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="history-{pk}.{output}"'
+
+    return response
+
+
+def event(data) -> str:
+    """
+    Formata o resumo do dia como um evento SSE
+    """
+
+    content = json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":"))
+    return f"event: resume\ndata: {content}\n\n"
+
+
+@async_api(methods=["GET"])
+async def events(request, pk):
+    """
+        Stream (SSE) com o resumo do dia, no formato do resume, a cada consumo registrado
+
+        Começa pelo resumo atual, caso o dia exista. Sem consumos, só envia comentários de
+        keepalive. A conexão é encerrada após TRACKER_EVENTS_MAX_AGE segundos e o
+        EventSource do cliente reconecta sozinho
+    """
+
+    user = await get_user(pk)
+    date = user.local_date()
+
+    # Inscreve antes de ler o resumo atual para não perder um consumo registrado nesse meio tempo
+    broker = get_broker()
+    subscription = broker.subscribe(user_channel(user.pk))
+
+    if not (entry := await aget_resume(user.pk, date)):
+        version = await aresume_version(user.pk, date)
+        queryset = History.objects.filter(user_id__exact=user.pk, date__exact=date)
+        if days := await sync_to_async(history_data)(history_queryset(queryset)[:1]):
+            entry = await aset_resume(user.pk, date, days[0], version)
+
+    async def stream():
+        try:
+            yield f"retry: {settings.TRACKER_EVENTS_RETRY}\n\n"
+            if entry:
+                yield event(entry["data"])
+
+            deadline = subscription.loop.time() + settings.TRACKER_EVENTS_MAX_AGE
+            while (remaining := deadline - subscription.loop.time()) > 0:
+                messages = await subscription.receive(min(settings.TRACKER_EVENTS_KEEPALIVE, remaining))
+                if not messages:
+                    yield ": keepalive\n\n"
+
+                for message in messages:
+                    yield event(message)
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingHttpResponse(
+        stream(),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
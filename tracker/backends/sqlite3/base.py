@@ -0,0 +1,27 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite ajustado para escritas concorrentes
+
+    Aplica os pragmas de OPTIONS["pragmas"] em cada nova conexão e abre as transações com
+    BEGIN IMMEDIATE, reservando a escrita já no início. Com o BEGIN padrão duas transações
+    que leem e depois escrevem falham com "database is locked" sem esperar o busy_timeout
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("pragmas", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+
+        for name, value in self.settings_dict["OPTIONS"].get("pragmas", {}).items():
+            conn.execute(f"PRAGMA {name} = {value}")
+
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
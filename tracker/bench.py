@@ -0,0 +1,57 @@
+import os
+import statistics
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+def percentile(values: list, percent: float) -> float:
+    """
+    Percentil pelo método do valor mais próximo. Retorna 0 para listas vazias
+    """
+
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def summarize_latencies(latencies: list) -> dict:
+    """
+    Resume latências (em ms) nos percentis usados pelos relatórios de benchmark
+    """
+
+    return {
+        "mean": round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        "p50": round(percentile(latencies, 50), 3),
+        "p95": round(percentile(latencies, 95), 3),
+        "p99": round(percentile(latencies, 99), 3),
+        "max": round(max(latencies), 3) if latencies else 0.0,
+    }
+
+
+@contextmanager
+def isolated_database():
+    """
+    Cria um banco de testes descartável, para não tocar nos dados locais. No SQLite o banco
+    fica em arquivo, permitindo acesso de várias threads
+    """
+
+    setup_test_environment()
+    directory = tempfile.TemporaryDirectory()
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory.name, 'bench.sqlite3')
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        directory.cleanup()
+        teardown_test_environment()
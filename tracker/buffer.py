@@ -0,0 +1,227 @@
+"""
+Modo write-behind do drink (TRACKER_WRITE_BEHIND), para picos de escrita
+
+O drink apenas enfileira o consumo em memória e responde 202. Uma thread do processo grava
+os consumos em lotes, uma transação por lote (Intake em bulk, totais de History e
+consolidados incrementados uma vez por dia), em vez de uma transação por requisição.
+
+A fila é limitada por TRACKER_WRITE_BEHIND_MAX_PENDING: cheia, o drink volta a gravar na hora.
+Os pendentes são gravados ao encerrar o processo. O resume de um usuário com consumos pendentes
+grava os dele antes de ler, garantindo que ele veja as próprias escritas. Como a fila é do
+processo, com vários workers essa garantia vale para requisições atendidas pelo mesmo worker
+"""
+
+import atexit
+import logging
+import threading
+from collections import deque
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from tracker.models import User, History
+from tracker.routers import read_from_replica
+from tracker.sync import write_intakes
+
+logger = logging.getLogger("tracker.buffer")
+
+
+class IntakeBuffer:
+    """
+    Fila limitada de consumos ainda não gravados e a thread que os grava em lotes
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        # Serializa as gravações da thread e as feitas pelo resume
+        self.flushing = threading.Lock()
+        self.queue = deque()
+        # Itens retirados da fila cujo lote ainda não terminou de ser gravado
+        self.in_flight = []
+        # (user_id, date) -> [quantidade, consumos] pendentes, incluindo os em gravação
+        self.totals = {}
+        # Incrementada a cada lote gravado, permite ler banco e pendentes de forma consistente
+        self.generation = 0
+        self.thread = None
+        self.stopping = False
+        self.registered = False
+
+    def __len__(self):
+        with self.condition:
+            return len(self.queue) + len(self.in_flight)
+
+    def enqueue(self, user_id: int, date, quantity):
+        """
+        Enfileira o consumo e retorna sua chave, ou None caso a fila esteja cheia
+        """
+
+        with self.condition:
+            if len(self.queue) + len(self.in_flight) >= settings.TRACKER_WRITE_BEHIND_MAX_PENDING:
+                return None
+
+            # A chave vira o client_key do Intake, correlacionando a resposta ao consumo gravado
+            key = uuid4().hex
+            self.queue.append(
+                {"key": key, "user": user_id, "date": date, "quantity": quantity, "created_at": timezone.now()}
+            )
+
+            totals = self.totals.setdefault((user_id, date), [0, 0])
+            totals[0] += quantity
+            totals[1] += 1
+
+            self.start()
+            if len(self.queue) >= settings.TRACKER_WRITE_BEHIND_BATCH_SIZE:
+                self.condition.notify()
+
+        return key
+
+    def pending(self, user_id, date=None) -> tuple:
+        """
+        Quantidade e número de consumos ainda não gravados do usuário (no dia, caso informado)
+        """
+
+        amount, count = 0, 0
+        with self.condition:
+            for (pending_user, pending_date), totals in self.totals.items():
+                if str(pending_user) == str(user_id) and date in (None, pending_date):
+                    amount += totals[0]
+                    count += totals[1]
+
+        return amount, count
+
+    def day(self, user: User, date) -> History:
+        """
+        Dia do histórico como ficará após gravar os pendentes, sem escrever no banco.
+        Pode não ter id caso o dia ainda não exista
+        """
+
+        # Relê caso um lote termine entre as duas leituras, o que contaria consumos duas vezes ou nenhuma
+        while True:
+            generation = self.generation
+            point = History.objects.filter(user_id=user, date=date).first()
+            amount, count = self.pending(user.pk, date)
+            if generation == self.generation:
+                break
+
+        if point is None:
+            point = History(user_id=user, date=date, goal=user.daily_goal)
+
+        point.amount_taken += amount
+        point.intake_count += count
+        return point
+
+    def flush(self, user_id=None):
+        """
+        Grava os pendentes (todos ou só os do usuário) em lotes de TRACKER_WRITE_BEHIND_BATCH_SIZE
+        """
+
+        # Gravações leem do banco principal mesmo quando chamadas de uma view servida pela réplica
+        with self.flushing, read_from_replica(False):
+            while batch := self.take(user_id):
+                self.write(batch)
+
+                with self.condition:
+                    for item in batch:
+                        key = (item["user"], item["date"])
+                        self.totals[key][0] -= item["quantity"]
+                        self.totals[key][1] -= 1
+                        if not self.totals[key][1]:
+                            del self.totals[key]
+
+                    self.in_flight = []
+                    self.generation += 1
+
+    def take(self, user_id=None) -> list:
+        with self.condition:
+            size = settings.TRACKER_WRITE_BEHIND_BATCH_SIZE
+            if user_id is None:
+                batch = [self.queue.popleft() for _ in range(min(size, len(self.queue)))]
+            else:
+                batch, remaining = [], deque()
+                for item in self.queue:
+                    mine = str(item["user"]) == str(user_id) and len(batch) < size
+                    (batch if mine else remaining).append(item)
+                self.queue = remaining
+
+            self.in_flight = batch
+            return batch
+
+    def write(self, batch: list):
+        """
+        Grava o lote em uma transação. Caso falhe, tenta item a item e descarta (com log) os que falharem
+        """
+
+        # Usuários removidos depois do drink não têm onde gravar
+        users = User.objects.in_bulk({item["user"] for item in batch})
+        items = [item for item in batch if item["user"] in users]
+        for item in batch:
+            if item["user"] not in users:
+                logger.warning("Consumo descartado, usuário não existe: %s", item)
+
+        if not items:
+            return
+
+        try:
+            with transaction.atomic():
+                write_intakes(items, users, incremental=True)
+            return
+        except Exception:
+            logger.exception("Falha ao gravar lote de %d consumos, gravando um a um", len(items))
+
+        for item in items:
+            try:
+                with transaction.atomic():
+                    write_intakes([item], users, incremental=True)
+            except Exception:
+                logger.exception("Consumo descartado: %s", item)
+
+    def start(self):
+        """
+        Inicia a thread de gravação na primeira escrita. Chamada com self.condition adquirido
+        """
+
+        if self.thread is not None and self.thread.is_alive():
+            return
+
+        self.stopping = False
+        self.thread = threading.Thread(target=self.run, name="tracker-write-behind", daemon=True)
+        self.thread.start()
+
+        if not self.registered:
+            atexit.register(self.stop)
+            self.registered = True
+
+    def run(self):
+        try:
+            while True:
+                with self.condition:
+                    if not self.stopping and len(self.queue) < settings.TRACKER_WRITE_BEHIND_BATCH_SIZE:
+                        self.condition.wait(settings.TRACKER_WRITE_BEHIND_INTERVAL)
+                    stopping = self.stopping
+
+                self.flush()
+                if stopping:
+                    return
+        finally:
+            connection.close()
+
+    def stop(self):
+        """
+        Para a thread e grava o que ainda estiver pendente. Registrada em atexit
+        """
+
+        with self.condition:
+            self.stopping = True
+            thread = self.thread
+            self.condition.notify()
+
+        if thread is not None:
+            thread.join()
+
+        self.flush()
+        self.thread = None
+
+
+buffer = IntakeBuffer()
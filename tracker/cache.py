@@ -0,0 +1,140 @@
+import hashlib
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def resume_cache_key(user_id, date) -> str:
+    return f"tracker:resume:{user_id}:{date}"
+
+
+def resume_version_key(user_id, date) -> str:
+    return f"tracker:resume-version:{user_id}:{date}"
+
+
+def valid_entry(values: dict, user_id, date):
+    """
+    A entrada só vale se foi montada na versão atual do dia, isto é, depois da última escrita nele
+    """
+
+    entry = values.get(resume_cache_key(user_id, date))
+    version = values.get(resume_version_key(user_id, date))
+    if entry is not None and version is not None and entry["version"] == version:
+        return entry
+
+    return None
+
+
+def get_resume(user_id, date):
+    """
+    Retorna o resumo do dia já serializado e seu ETag, ou None caso não esteja no cache
+    """
+
+    values = cache.get_many([resume_cache_key(user_id, date), resume_version_key(user_id, date)])
+    return valid_entry(values, user_id, date)
+
+
+def resume_version(user_id, date) -> str:
+    """
+    Versão atual do resumo do dia, trocada a cada escrita. Deve ser lida antes de consultar o
+    banco e repassada a set_resume: caso um drink termine no meio, o resumo lido não é guardado
+    """
+
+    key = resume_version_key(user_id, date)
+    cache.add(key, uuid4().hex, settings.TRACKER_RESUME_CACHE_TIMEOUT)
+
+    return cache.get(key)
+
+
+def make_entry(data) -> dict:
+    """
+    Monta a entrada do cache com o resumo serializado e o ETag calculado a partir do conteúdo
+    """
+
+    content = JSONEncoder(sort_keys=True).encode(data).encode()
+
+    return {
+        "etag": f'"{hashlib.md5(content).hexdigest()}"',
+        "data": data,
+    }
+
+
+def set_resume(user_id, date, data, version) -> dict:
+    """
+    Guarda o resumo serializado do dia no cache, caso 'version' (de resume_version) ainda seja a atual
+    """
+
+    entry = make_entry(data)
+    if version is not None and cache.get(resume_version_key(user_id, date)) == version:
+        cache.set(
+            resume_cache_key(user_id, date), {**entry, "version": version}, settings.TRACKER_RESUME_CACHE_TIMEOUT
+        )
+
+    return entry
+
+
+def invalidate_resume(*days):
+    """
+    Remove do cache o resumo e a versão dos dias (user_id, date) informados após o commit da transação
+    """
+
+    keys = []
+    for user_id, date in days:
+        keys += [resume_cache_key(user_id, date), resume_version_key(user_id, date)]
+
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def timezone_cache_key(user_id) -> str:
+    return f"tracker:timezone:{user_id}"
+
+
+def get_user_timezone(user_id):
+    """
+    Retorna o fuso do usuário guardado no cache, ou None. Evita consultar o banco só para saber o dia atual
+    """
+
+    return cache.get(timezone_cache_key(user_id))
+
+
+def set_user_timezone(user_id, name: str):
+    # Removido quando o usuário é alterado. O prazo limita o atraso em caches que não são
+    # compartilhados entre os workers, onde a remoção só vale para o próprio processo
+    cache.set(timezone_cache_key(user_id), name, settings.TRACKER_USER_TIMEZONE_CACHE_TIMEOUT)
+
+
+def invalidate_user_timezone(user_id):
+    transaction.on_commit(lambda: cache.delete(timezone_cache_key(user_id)))
+
+
+async def aget_resume(user_id, date):
+    values = await cache.aget_many([resume_cache_key(user_id, date), resume_version_key(user_id, date)])
+    return valid_entry(values, user_id, date)
+
+
+async def aresume_version(user_id, date) -> str:
+    key = resume_version_key(user_id, date)
+    await cache.aadd(key, uuid4().hex, settings.TRACKER_RESUME_CACHE_TIMEOUT)
+
+    return await cache.aget(key)
+
+
+async def aset_resume(user_id, date, data, version) -> dict:
+    entry = make_entry(data)
+    if version is not None and await cache.aget(resume_version_key(user_id, date)) == version:
+        await cache.aset(
+            resume_cache_key(user_id, date), {**entry, "version": version}, settings.TRACKER_RESUME_CACHE_TIMEOUT
+        )
+
+    return entry
+
+
+async def aget_user_timezone(user_id):
+    return await cache.aget(timezone_cache_key(user_id))
+
+
+async def aset_user_timezone(user_id, name: str):
+    await cache.aset(timezone_cache_key(user_id), name, settings.TRACKER_USER_TIMEZONE_CACHE_TIMEOUT)
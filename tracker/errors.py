@@ -5,3 +5,9 @@ class BadParams(APIException):
     status_code = 400
     default_detail = "Parâmetro(os) inválidos"
     default_code = "invalid_params"
+
+
+class Conflict(APIException):
+    status_code = 409
+    default_detail = "Conflito ao gravar os dados, tente novamente"
+    default_code = "conflict"
@@ -0,0 +1,155 @@
+"""
+Publicação do resumo do dia para o stream de eventos (SSE) de cada usuário
+
+O drink publica o resumo atualizado, no formato de HistorySerializer, no canal do usuário
+e o endpoint /users/{id}/events/ (apenas em ASGI) o repassa aos clientes conectados.
+O broker é configurável em TRACKER_EVENT_BROKER. LocalBroker distribui em memória,
+dentro do processo. Conexões ociosas apenas aguardam um asyncio.Event, sem consultar o banco
+"""
+
+import asyncio
+import functools
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from tracker.cache import resume_version, set_resume
+from tracker.models import History
+from tracker.representations import history_data, history_queryset
+
+
+def user_channel(user_id) -> str:
+    return f"tracker:user:{user_id}"
+
+
+class Subscription:
+    """
+    Mensagens de um canal ainda não lidas por uma conexão. Só guarda as mais recentes,
+    pois cada resumo substitui o anterior
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.messages = deque(maxlen=settings.TRACKER_EVENTS_BACKLOG)
+        self.ready = asyncio.Event()
+
+    def push(self, message):
+        """
+        Entrega uma mensagem. Pode ser chamada de qualquer thread
+        """
+
+        try:
+            self.loop.call_soon_threadsafe(self.deliver, message)
+        except RuntimeError:
+            # O loop da conexão já foi encerrado
+            pass
+
+    def deliver(self, message):
+        self.messages.append(message)
+        self.ready.set()
+
+    async def receive(self, timeout: float) -> list:
+        """
+        Aguarda até 'timeout' segundos e retorna as mensagens pendentes (lista vazia se nenhuma chegou)
+        """
+
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+
+        self.ready.clear()
+        messages = list(self.messages)
+        self.messages.clear()
+
+        return messages
+
+
+class Broker:
+    """
+    Base dos brokers de eventos. 'publish' pode ser chamado de qualquer thread;
+    'subscribe' e 'unsubscribe', do loop da conexão
+    """
+
+    def subscribe(self, channel: str) -> Subscription:
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription: Subscription):
+        raise NotImplementedError
+
+    def publish(self, channel: str, message):
+        raise NotImplementedError
+
+    def has_subscribers(self, channel: str) -> bool:
+        """
+        Permite pular a montagem da mensagem quando ninguém acompanha o canal
+        """
+
+        return True
+
+
+class LocalBroker(Broker):
+    """
+    Distribui as mensagens entre as conexões do próprio processo
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(channel)
+        with self.lock:
+            self.subscriptions.setdefault(channel, set()).add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.channel, None)
+
+    def publish(self, channel: str, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+
+        for subscription in subscriptions:
+            subscription.push(message)
+
+    def has_subscribers(self, channel: str) -> bool:
+        return channel in self.subscriptions
+
+
+@functools.lru_cache
+def load_broker(path: str) -> Broker:
+    return import_string(path)()
+
+
+def get_broker() -> Broker:
+    return load_broker(settings.TRACKER_EVENT_BROKER)
+
+
+def publish_day(user_id, date):
+    """
+    Após o commit, publica o resumo atualizado do dia no canal do usuário e o guarda no cache
+    do resume. Sem ninguém acompanhando o usuário, não consulta o banco
+    """
+
+    broker = get_broker()
+    channel = user_channel(user_id)
+    if not broker.has_subscribers(channel):
+        return
+
+    def publish():
+        version = resume_version(user_id, date)
+        queryset = History.objects.filter(user_id__exact=user_id, date__exact=date)
+        if days := history_data(history_queryset(queryset)[:1]):
+            broker.publish(channel, set_resume(user_id, date, days[0], version)["data"])
+
+    transaction.on_commit(publish)
@@ -0,0 +1,84 @@
+import csv
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from rest_framework.utils.encoders import JSONEncoder
+
+from tracker.serializers import HistorySerializer, DayTotalsSerializer
+
+# Quantidade de dias lidos do banco por vez durante a exportação
+CHUNK_SIZE = 500
+
+
+class Echo:
+    """
+    Arquivo falso para o csv.writer, devolve a linha escrita em vez de guardá-la
+    """
+
+    def write(self, value):
+        return value
+
+
+def get_serializer_class(intakes: bool):
+    return HistorySerializer if intakes else DayTotalsSerializer
+
+
+def iterate_rows(queryset, intakes: bool):
+    """
+    Serializa os dias um a um, sem carregar o histórico inteiro em memória
+    """
+
+    if not intakes:
+        queryset = queryset.prefetch_related(None).select_related(None)
+
+    serializer_class = get_serializer_class(intakes)
+    for history in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield serializer_class(history).data
+
+
+def stream_ndjson(queryset, intakes: bool):
+    """
+    Um objeto JSON por linha
+    """
+
+    encoder = JSONEncoder(ensure_ascii=False)
+    for row in iterate_rows(queryset, intakes):
+        yield encoder.encode(row) + "\n"
+
+
+def stream_csv(queryset, intakes: bool):
+    """
+    Cabeçalho seguido de uma linha por dia. Os consumos, quando pedidos, são separados por ';'
+    """
+
+    writer = csv.writer(Echo())
+    header = list(get_serializer_class(intakes)().fields)
+    yield writer.writerow(header)
+
+    for row in iterate_rows(queryset, intakes):
+        if intakes:
+            row["intakes"] = ";".join(intake["quantity"] for intake in row["intakes"])
+
+        yield writer.writerow([row[field] for field in header])
+
+
+async def aiterate(lines, size: int = CHUNK_SIZE):
+    """
+    Percorre um dos streams acima em ASGI. Em vez de ler tudo antes do primeiro byte, como o Django
+    faz com geradores síncronos, busca 'size' linhas por vez em uma thread. Como as chamadas usam
+    sempre a mesma thread, o cursor do banco continua aberto entre os lotes
+    """
+
+    next_chunk = sync_to_async(lambda: list(islice(lines, size)))
+    try:
+        while chunk := await next_chunk():
+            for line in chunk:
+                yield line
+    finally:
+        await sync_to_async(lines.close)()
+
+
+EXPORT_FORMATS = {
+    "ndjson": (stream_ndjson, "application/x-ndjson"),
+    "csv": (stream_csv, "text/csv"),
+}
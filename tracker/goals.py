@@ -0,0 +1,55 @@
+"""
+Fórmula da meta diária, configurável em TRACKER_GOAL_FORMULA
+
+Cada fórmula calcula a meta em Python (dias novos) e como expressão SQL, usada por
+tracker.stats.recompute_goals para recalcular as metas gravadas sem carregar instâncias
+"""
+
+import functools
+
+from django.conf import settings
+from django.db import models
+from django.db.models import ExpressionWrapper, F, Value
+from django.db.models.functions import Cast, Floor
+from django.utils.module_loading import import_string
+
+
+class GoalFormula:
+    """
+    Base das fórmulas de meta diária, em ML inteiros, a partir do peso do usuário em gramas
+    """
+
+    def compute(self, weight):
+        raise NotImplementedError
+
+    def expression(self, weight=F('weight_grams')):
+        """
+        Mesmo cálculo de compute, como expressão SQL sobre a coluna de peso
+        """
+
+        raise NotImplementedError
+
+
+class WeightFormula(GoalFormula):
+    """
+    Peso em KG * 35ML, arredondado para o ML mais próximo
+    """
+
+    ml_per_kg = 35
+
+    def compute(self, weight):
+        return (weight * self.ml_per_kg + 500) // 1000
+
+    def expression(self, weight=F('weight_grams')):
+        # Divisão em ponto flutuante seguida de FLOOR, pois a divisão inteira varia entre bancos
+        milliliters = ExpressionWrapper(weight * Value(self.ml_per_kg) + Value(500), output_field=models.FloatField())
+        return Cast(Floor(milliliters / Value(1000.0)), models.IntegerField())
+
+
+@functools.lru_cache
+def load_goal_formula(path: str) -> GoalFormula:
+    return import_string(path)()
+
+
+def get_goal_formula() -> GoalFormula:
+    return load_goal_formula(settings.TRACKER_GOAL_FORMULA)
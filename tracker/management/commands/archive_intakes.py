@@ -0,0 +1,126 @@
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from tracker.cache import invalidate_resume
+from tracker.models import History, Intake, IntakeArchive, progress_value
+from tracker.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Move os consumos de dias mais antigos que a retenção para IntakeArchive, "
+        "uma linha compactada por dia, e congela os totais em History"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.TRACKER_INTAKE_RETENTION_DAYS,
+            help="Dias mantidos com os consumos em Intake"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Quantidade de dias arquivados por transação"
+        )
+        parser.add_argument(
+            "--every",
+            type=int,
+            help="Repete o arquivamento a cada N minutos, para rodar como processo agendado"
+        )
+
+    def archive_batch(self, ids: list) -> tuple:
+        """
+        Arquiva os dias informados. Retorna a quantidade de consumos movidos e os usuários
+        cujos totais precisaram ser corrigidos
+        """
+
+        with transaction.atomic():
+            # Trava os dias para que nenhum consumo novo seja inserido entre a leitura e a remoção
+            days = History.objects.select_for_update().in_bulk(ids)
+            archives = {
+                archive.history_id_id: archive for archive in IntakeArchive.objects.filter(history_id__in=ids)
+            }
+
+            intakes = defaultdict(list)
+            rows = Intake.objects.filter(history_id__in=ids).order_by('history_id', 'pk')
+            for history_id, pk, quantity, created_at in rows.values_list('history_id', 'pk', 'quantity', 'created_at'):
+                intakes[history_id].append((pk, quantity, created_at))
+
+            now = timezone.now()
+            created, updated, changed = [], [], []
+            for history_id, day_intakes in intakes.items():
+                archive = archives.get(history_id)
+                if archive is None:
+                    archive = IntakeArchive(history_id_id=history_id)
+                    created.append(archive)
+                else:
+                    day_intakes = [
+                        (intake.pk, intake.quantity, intake.created_at) for intake in archive.unpack()
+                    ] + day_intakes
+                    updated.append(archive)
+
+                archive.data = IntakeArchive.pack(day_intakes)
+                archive.count = len(day_intakes)
+                archive.total = sum(quantity for _, quantity, _ in day_intakes)
+                archive.archived_at = now
+
+                # Os totais passam a valer pelo arquivo. Só mudam se tiverem saído de sincronia
+                day = days[history_id]
+                if day.amount_taken != archive.total or day.intake_count != archive.count:
+                    day.amount_taken = archive.total
+                    day.intake_count = archive.count
+                    day.progress = progress_value(archive.total, day.goal)
+                    changed.append(day)
+
+            IntakeArchive.objects.bulk_create(created)
+            IntakeArchive.objects.bulk_update(updated, ['data', 'count', 'total', 'archived_at'])
+            History.objects.bulk_update(changed, ['amount_taken', 'intake_count', 'progress'])
+
+            moved, _ = Intake.objects.filter(history_id__in=list(intakes)).delete()
+            invalidate_resume(*[(day.user_id_id, day.date) for day in changed])
+
+        return moved, {day.user_id_id for day in changed}
+
+    def archive(self, retention: int, batch_size: int):
+        cutoff = timezone.localdate() - timezone.timedelta(days=retention)
+        pending = (
+            History.objects.filter(date__lt=cutoff, intake__isnull=False)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+            .distinct()
+        )
+
+        # Percorre por faixas de id, uma transação curta por lote
+        last, days, moved, users = 0, 0, 0, set()
+        while ids := list(pending.filter(pk__gt=last)[:batch_size]):
+            batch_moved, batch_users = self.archive_batch(ids)
+            last = ids[-1]
+            days += len(ids)
+            moved += batch_moved
+            users |= batch_users
+
+        if users:
+            rebuild_stats(users)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{days} dia(s) arquivado(s), {moved} consumo(s) movido(s)"
+        ))
+
+    def handle(self, *args, **options):
+        batch_size = max(options["batch_size"], 1)
+
+        while True:
+            self.archive(options["days"], batch_size)
+
+            if not options["every"]:
+                return
+
+            time.sleep(options["every"] * 60)
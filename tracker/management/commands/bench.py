@@ -0,0 +1,144 @@
+import json
+import platform
+import random
+import threading
+import time
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from tracker.bench import isolated_database, summarize_latencies
+from tracker.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark reprodutível da API: cria um banco isolado, popula com dados sintéticos e "
+        "mede vazão, latência e consultas por requisição de cada endpoint"
+    )
+
+    # nome: (método, rota, rota recebe o id do usuário)
+    endpoints = {
+        "drink": ("post", "user-drink", True),
+        "resume": ("get", "user-resume", True),
+        "history": ("get", "user-history", True),
+        "user_list": ("get", "user-list", False),
+        "user_retrieve": ("get", "user-detail", True),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200, help="Usuários criados no banco do benchmark")
+        parser.add_argument("--days", type=int, default=30, help="Dias de histórico por usuário")
+        parser.add_argument("--intakes", type=int, default=8, help="Consumos por dia")
+        parser.add_argument("--requests", type=int, default=500, help="Requisições por endpoint")
+        parser.add_argument("--concurrency", type=int, default=8, help="Requisições simultâneas")
+        parser.add_argument("--seed", type=int, default=0, help="Semente dos dados e do sorteio dos usuários")
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            choices=list(self.endpoints),
+            help="Endpoints exercitados (padrão: todos)"
+        )
+        parser.add_argument("--output", help="Arquivo onde gravar o resultado em JSON")
+
+    def call(self, client: Client, endpoint: str, user_id: int):
+        method, route, detail = self.endpoints[endpoint]
+        url = reverse(route, kwargs={'pk': user_id}) if detail else reverse(route)
+        data = json.dumps({"quantity": 250}) if method == "post" else None
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data, content_type='application/json')
+            elapsed = time.perf_counter() - started
+
+        return elapsed, response.status_code < 400, len(queries.captured_queries)
+
+    def run_endpoint(self, endpoint: str, user_ids: list, options: dict) -> dict:
+        rng = random.Random(options["seed"])
+        pending = iter([rng.choice(user_ids) for _ in range(options["requests"])])
+        lock = threading.Lock()
+        results = []
+
+        def worker():
+            # Erros do servidor contam como falha em vez de derrubar a thread
+            client = Client(raise_request_exception=False)
+            try:
+                while True:
+                    with lock:
+                        user_id = next(pending, None)
+                    if user_id is None:
+                        return
+
+                    result = self.call(client, endpoint, user_id)
+                    with lock:
+                        results.append(result)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options["concurrency"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies = [latency * 1000 for latency, ok, _ in results if ok]
+        queries = [count for _, ok, count in results if ok]
+
+        return {
+            "requests": len(results),
+            "errors": sum(1 for _, ok, _ in results if not ok),
+            "requests_per_second": round(len(results) / elapsed, 2),
+            "latency_ms": summarize_latencies(latencies),
+            "queries_per_request": {
+                "mean": round(sum(queries) / len(queries), 2) if queries else 0.0,
+                "max": max(queries, default=0),
+            },
+        }
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            call_command(
+                'seed_tracker',
+                users=options["users"],
+                days=options["days"],
+                intakes=options["intakes"],
+                seed=options["seed"],
+                stdout=self.stdout
+            )
+
+            user_ids = list(User.objects.values_list("pk", flat=True))
+            endpoints = options["endpoint"] or list(self.endpoints)
+            results = {endpoint: self.run_endpoint(endpoint, user_ids, options) for endpoint in endpoints}
+
+        report = {
+            "generated_at": timezone.now().isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+            },
+            "config": {
+                key: options[key] for key in ("users", "days", "intakes", "requests", "concurrency", "seed")
+            },
+            "results": results,
+        }
+
+        for endpoint, result in results.items():
+            latency = result["latency_ms"]
+            self.stdout.write(
+                f"{endpoint:<14} {result['requests_per_second']:>9.2f} req/s  "
+                f"p50 {latency['p50']:>8.2f}ms  p99 {latency['p99']:>8.2f}ms  "
+                f"consultas {result['queries_per_request']['mean']:>6.2f}  erros {result['errors']}"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
@@ -0,0 +1,85 @@
+import json
+import statistics
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from tracker.bench import isolated_database
+from tracker.models import History, User
+from tracker.renderers import FastJSONRenderer
+from tracker.representations import USER_VALUES, history_data, history_queryset, user_data
+from tracker.serializers import HistorySerializer, UserSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Microbenchmark da serialização do histórico e da listagem de usuários: serializers do DRF "
+        "contra tracker.representations. Inclui as consultas e o render, em ms por 1.000 linhas"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000, help="Dias do histórico e usuários serializados")
+        parser.add_argument("--intakes", type=int, default=8, help="Consumos por dia")
+        parser.add_argument("--repeat", type=int, default=20, help="Repetições de cada caminho")
+        parser.add_argument("--seed", type=int, default=0, help="Semente dos dados")
+        parser.add_argument("--output", help="Arquivo onde gravar o resultado em JSON")
+
+    @staticmethod
+    def cases() -> dict:
+        history = History.objects.order_by('id')
+        users = User.objects.order_by('id')
+
+        return {
+            "history": (
+                lambda: JSONRenderer().render(HistorySerializer(history.with_summary(), many=True).data),
+                lambda: FastJSONRenderer().render(history_data(history_queryset(history.all()))),
+            ),
+            "users": (
+                lambda: JSONRenderer().render(UserSerializer(users.all(), many=True).data),
+                lambda: FastJSONRenderer().render(user_data(users.values(*USER_VALUES))),
+            ),
+        }
+
+    @staticmethod
+    def measure(path, repeat: int) -> float:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            path()
+            timings.append(time.perf_counter() - started)
+
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        rows = max(options["rows"], 1)
+
+        with isolated_database():
+            call_command(
+                'seed_tracker', users=rows, days=1, intakes=options["intakes"], seed=options["seed"], stdout=self.stdout
+            )
+
+            results = {}
+            for name, (drf, fast) in self.cases().items():
+                if drf() != fast():
+                    raise CommandError(f"Saída de '{name}' difere entre os dois caminhos")
+
+                per_thousand = 1000 * 1000 / rows
+                drf_ms = self.measure(drf, options["repeat"]) * per_thousand
+                fast_ms = self.measure(fast, options["repeat"]) * per_thousand
+                results[name] = {
+                    "drf_ms_per_1000": round(drf_ms, 3),
+                    "fast_ms_per_1000": round(fast_ms, 3),
+                    "speedup": round(drf_ms / fast_ms, 2),
+                }
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<8} drf {result['drf_ms_per_1000']:>9.2f}ms  "
+                f"rápido {result['fast_ms_per_1000']:>9.2f}ms  {result['speedup']:>5.2f}x"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({"rows": rows, "intakes": options["intakes"], "results": results}, output, indent=2)
@@ -0,0 +1,115 @@
+import json
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.db.models import Sum
+from django.db.models.functions import Cast
+from rest_framework import serializers
+
+from tracker.bench import isolated_database
+from tracker.models import History, Intake
+from tracker.representations import decimal_string
+from tracker.serializers import FixedPointField
+
+# Como as colunas em ML eram lidas antes da migração 0010 (DecimalField)
+DECIMAL = models.DecimalField(max_digits=10, decimal_places=2)
+
+
+class Command(BaseCommand):
+    help = (
+        "Microbenchmark do armazenamento em ML inteiros contra o DecimalField anterior: agregações "
+        "(SUM por dia e por usuário) e serialização das quantidades, em ms por 100.000 linhas"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200, help="Usuários criados")
+        parser.add_argument("--days", type=int, default=60, help="Dias de histórico por usuário")
+        parser.add_argument("--intakes", type=int, default=8, help="Consumos por dia")
+        parser.add_argument("--repeat", type=int, default=10, help="Repetições de cada caminho")
+        parser.add_argument("--seed", type=int, default=0, help="Semente dos dados")
+        parser.add_argument("--output", help="Arquivo onde gravar o resultado em JSON")
+
+    @staticmethod
+    def cases() -> dict:
+        """
+        Pares (decimal, inteiro) de cada operação. O caminho decimal lê as mesmas colunas com
+        Cast para DecimalField, passando pela mesma conversão por linha que o Django fazia
+        """
+
+        intakes = Intake.objects.order_by()
+        history = History.objects.order_by()
+        quantities = list(intakes.values_list('quantity', flat=True))
+        decimals = [Decimal(quantity).quantize(Decimal('0.01')) for quantity in quantities]
+        drf_decimal = serializers.DecimalField(max_digits=6, decimal_places=2)
+        drf_integer = FixedPointField()
+
+        return {
+            "sum_per_day": (
+                lambda: list(intakes.values('history_id').annotate(total=Sum(Cast('quantity', DECIMAL)))),
+                lambda: list(intakes.values('history_id').annotate(total=Sum('quantity'))),
+            ),
+            "sum_per_user": (
+                lambda: list(history.values('user_id').annotate(total=Sum(Cast('amount_taken', DECIMAL)))),
+                lambda: list(history.values('user_id').annotate(total=Sum('amount_taken'))),
+            ),
+            "read_quantities": (
+                lambda: list(intakes.annotate(value=Cast('quantity', DECIMAL)).values_list('value', flat=True)),
+                lambda: list(intakes.values_list('quantity', flat=True)),
+            ),
+            "decimal_string": (
+                lambda: [decimal_string(quantity) for quantity in decimals],
+                lambda: [decimal_string(quantity) for quantity in quantities],
+            ),
+            "drf_field": (
+                lambda: [drf_decimal.to_representation(quantity) for quantity in decimals],
+                lambda: [drf_integer.to_representation(quantity) for quantity in quantities],
+            ),
+        }
+
+    @staticmethod
+    def measure(path, repeat: int) -> float:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            path()
+            timings.append(time.perf_counter() - started)
+
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            call_command(
+                'seed_tracker',
+                users=max(options["users"], 1),
+                days=max(options["days"], 1),
+                intakes=max(options["intakes"], 1),
+                seed=options["seed"],
+                stdout=self.stdout
+            )
+
+            rows = Intake.objects.count()
+            per_hundred_thousand = 1000 * 100000 / rows
+
+            results = {}
+            for name, (decimal, integer) in self.cases().items():
+                decimal_ms = self.measure(decimal, options["repeat"]) * per_hundred_thousand
+                integer_ms = self.measure(integer, options["repeat"]) * per_hundred_thousand
+                results[name] = {
+                    "decimal_ms_per_100000": round(decimal_ms, 3),
+                    "integer_ms_per_100000": round(integer_ms, 3),
+                    "speedup": round(decimal_ms / integer_ms, 2),
+                }
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<16} decimal {result['decimal_ms_per_100000']:>9.2f}ms  "
+                f"inteiro {result['integer_ms_per_100000']:>9.2f}ms  {result['speedup']:>5.2f}x"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({"intakes": rows, "results": results}, output, indent=2)
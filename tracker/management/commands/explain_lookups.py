@@ -0,0 +1,104 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+
+from tracker.bench import isolated_database
+from tracker.models import History, Intake
+
+
+class Command(BaseCommand):
+    help = (
+        "Mostra o plano (EXPLAIN) e a latência das consultas mais frequentes do tracker. "
+        "Com --compare, mede também sem os índices definidos nos modelos, em um banco isolado "
+        "populado pelo seed_tracker"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=200, help="Execuções de cada consulta")
+        parser.add_argument("--seed", type=int, default=0, help="Semente para sorteio dos usuários")
+        parser.add_argument(
+            "--compare",
+            action="store_true",
+            help="Remove temporariamente os índices dos modelos para comparar antes/depois. Roda em um banco isolado"
+        )
+        parser.add_argument("--users", type=int, default=200, help="Usuários criados no banco do --compare")
+        parser.add_argument("--days", type=int, default=60, help="Dias de histórico por usuário no --compare")
+        parser.add_argument("--intakes", type=int, default=8, help="Consumos por dia no --compare")
+
+    def lookups(self, rng: random.Random, points: list):
+        """
+        Retorna as consultas medidas, cada uma sorteando um dia existente a cada execução
+        """
+
+        def resume():
+            user_id, date, _ = rng.choice(points)
+            return History.objects.filter(user_id=user_id, date=date)
+
+        def history():
+            # Mesma ordem da paginação do endpoint
+            user_id, date, _ = rng.choice(points)
+            days = History.objects.filter(user_id=user_id, date__gte=date - timedelta(days=30))
+            return days.order_by('date', 'id')[:30]
+
+        def intake_total():
+            _, _, history_id = rng.choice(points)
+            return Intake.objects.filter(history_id=history_id).values('history_id').annotate(total=Sum('quantity'))
+
+        return {"resume": resume, "history": history, "intake_total": intake_total}
+
+    def measure(self, label: str, options: dict):
+        rng = random.Random(options["seed"])
+        points = list(History.objects.values_list('user_id', 'date', 'pk')[:10000])
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {label}"))
+        for name, build in self.lookups(rng, points).items():
+            self.stdout.write(self.style.MIGRATE_LABEL(name))
+            self.stdout.write(build().explain())
+
+            started = time.perf_counter()
+            for _ in range(options["repeat"]):
+                list(build())
+            elapsed = (time.perf_counter() - started) / options["repeat"]
+
+            self.stdout.write(f"latência média: {elapsed * 1000:.3f}ms\n")
+
+    def handle(self, *args, **options):
+        if not options["compare"]:
+            if not History.objects.exists():
+                raise CommandError("Nenhum histórico encontrado. Popule o banco com 'seed_tracker' antes")
+
+            self.measure("com índices", options)
+            return
+
+        # Remover índices no banco local o deixaria fora de sincronia com as migrações caso interrompido
+        with isolated_database():
+            call_command(
+                'seed_tracker',
+                users=max(options["users"], 1),
+                days=max(options["days"], 1),
+                intakes=max(options["intakes"], 1),
+                seed=options["seed"],
+                stdout=self.stdout
+            )
+            self.compare(options)
+
+    def compare(self, options: dict):
+        indexes = [(model, index) for model in (History, Intake) for index in model._meta.indexes]
+
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.remove_index(model, index)
+
+        try:
+            self.measure("sem índices", options)
+        finally:
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.add_index(model, index)
+
+        self.measure("com índices", options)
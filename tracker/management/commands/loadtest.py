@@ -0,0 +1,116 @@
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.bench import summarize_latencies
+from tracker.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Dispara requisições concorrentes contra servidores da API e compara vazão e latência. "
+        "Ex.: --target wsgi=http://127.0.0.1:8000 --target asgi=http://127.0.0.1:8001"
+    )
+
+    endpoints = {
+        "drink": ("POST", "users/{pk}/drink/"),
+        "resume": ("GET", "users/{pk}/resume/"),
+        "history": ("GET", "users/{pk}/history/"),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            action="append",
+            required=True,
+            help="Servidor no formato nome=url_base (pode ser repetido)"
+        )
+        parser.add_argument("--prefix", default="api/v1/", help="Prefixo das rotas da API")
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            choices=list(self.endpoints),
+            help="Endpoints exercitados (padrão: todos)"
+        )
+        parser.add_argument("--requests", type=int, default=1000, help="Requisições por endpoint")
+        parser.add_argument("--concurrency", type=int, default=32, help="Requisições simultâneas")
+        parser.add_argument("--timeout", type=float, default=30, help="Timeout de cada requisição em segundos")
+        parser.add_argument("--seed", type=int, default=0, help="Semente para sorteio dos usuários")
+        parser.add_argument("--output", help="Arquivo onde gravar o resultado em JSON")
+
+    def request(self, method: str, url: str, timeout: float):
+        body = json.dumps({"quantity": 250}).encode() if method == "POST" else None
+        request = urllib.request.Request(
+            url, data=body, method=method, headers={"Content-Type": "application/json"}
+        )
+
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+                ok = response.status < 400
+        except urllib.error.HTTPError as exc:
+            # Dia ainda inexistente no resume não é falha do servidor
+            ok = exc.code == 404
+        except OSError:
+            ok = False
+
+        return time.perf_counter() - started, ok
+
+    def run_endpoint(self, base_url: str, endpoint: str, user_ids: list, options: dict) -> dict:
+        method, route = self.endpoints[endpoint]
+        rng = random.Random(options["seed"])
+        urls = [
+            f"{base_url.rstrip('/')}/{options['prefix']}{route.format(pk=rng.choice(user_ids))}"
+            for _ in range(options["requests"])
+        ]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            results = list(executor.map(lambda url: self.request(method, url, options["timeout"]), urls))
+        elapsed = time.perf_counter() - started
+
+        latencies = [latency * 1000 for latency, ok in results if ok]
+
+        return {
+            "requests": len(results),
+            "errors": sum(1 for _, ok in results if not ok),
+            "requests_per_second": round(len(results) / elapsed, 2),
+            "latency_ms": summarize_latencies(latencies),
+        }
+
+    def handle(self, *args, **options):
+        targets = {}
+        for target in options["target"]:
+            name, separator, url = target.partition("=")
+            if not separator:
+                raise CommandError(f"Target inválido '{target}', use nome=url_base")
+            targets[name] = url
+
+        user_ids = list(User.objects.values_list("pk", flat=True)[:10000])
+        if not user_ids:
+            raise CommandError("Nenhum usuário encontrado. Popule o banco com 'seed_tracker' antes")
+
+        endpoints = options["endpoint"] or list(self.endpoints)
+        report = {
+            name: {endpoint: self.run_endpoint(url, endpoint, user_ids, options) for endpoint in endpoints}
+            for name, url in targets.items()
+        }
+
+        for name, results in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {name}"))
+            for endpoint, result in results.items():
+                latency = result["latency_ms"]
+                self.stdout.write(
+                    f"{endpoint:<10} {result['requests_per_second']:>10.2f} req/s  "
+                    f"p50 {latency['p50']:>8.2f}ms  p99 {latency['p99']:>8.2f}ms  erros {result['errors']}"
+                )
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
@@ -0,0 +1,54 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.purge import purge_counts, purge_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove definitivamente usuários e todo o seu histórico (por exemplo, pedidos de exclusão da LGPD/GDPR), "
+        "com DELETEs em lote e transações curtas"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("users", nargs="*", type=int, help="Ids dos usuários")
+        parser.add_argument("--file", help="Arquivo com um id por linha ('-' para a entrada padrão)")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Usuários por rodada e dias removidos por transação"
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Apenas conta as linhas que seriam removidas")
+
+    def read_ids(self, path: str) -> list:
+        lines = sys.stdin if path == "-" else open(path)
+        try:
+            return [int(line) for line in lines if line.strip()]
+        except ValueError as error:
+            raise CommandError(f"Id inválido em '{path}': {error}")
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+
+    def handle(self, *args, **options):
+        user_ids = list(options["users"])
+        if options["file"]:
+            user_ids += self.read_ids(options["file"])
+
+        if not user_ids:
+            raise CommandError("Informe os ids dos usuários ou --file")
+
+        user_ids = list(dict.fromkeys(user_ids))
+
+        if options["dry_run"]:
+            counts = purge_counts(user_ids)
+        else:
+            counts = purge_users(user_ids, options["batch_size"])
+
+        for label, count in counts.items():
+            self.stdout.write(f"{label:<22} {count}")
+
+        verb = "seriam removidos" if options["dry_run"] else "removidos"
+        self.stdout.write(self.style.SUCCESS(f"{counts.get('tracker.User', 0)} usuário(s) {verb}"))
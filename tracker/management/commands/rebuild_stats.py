@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from tracker.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Recalcula os consolidados semanais/mensais e as sequências a partir do histórico"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="users",
+            help="Restringe o recálculo ao(s) usuário(s) informado(s)"
+        )
+
+    def handle(self, *args, **options):
+        rebuild_stats(options["users"])
+
+        self.stdout.write(self.style.SUCCESS("Estatísticas recalculadas"))
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tracker.stats import recompute_goals
+
+
+class Command(BaseCommand):
+    help = (
+        "Reaplica a fórmula de meta (TRACKER_GOAL_FORMULA) às metas gravadas em History, "
+        "por padrão apenas de hoje em diante"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="users",
+            help="Restringe o recálculo ao(s) usuário(s) informado(s)"
+        )
+        parser.add_argument(
+            "--since",
+            help="Primeiro dia recalculado (YYYY-MM-DD). Padrão: ontem, para cobrir o dia atual em qualquer fuso"
+        )
+        parser.add_argument(
+            "--all-days",
+            action="store_true",
+            help="Recalcula também os dias passados"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Quantidade de ids do histórico cobertos por UPDATE"
+        )
+
+    def handle(self, *args, **options):
+        if options["all_days"]:
+            since = None
+        elif options["since"]:
+            try:
+                since = datetime.strptime(options["since"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError(f"Data inválida '{options['since']}', use YYYY-MM-DD")
+        else:
+            since = timezone.localdate() - timezone.timedelta(days=1)
+
+        updated = recompute_goals(options["users"], since, options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(f"{updated} meta(s) diária(s) recalculada(s)"))
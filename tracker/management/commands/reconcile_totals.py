@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from tracker.models import History, Intake, IntakeArchive, progress_of
+
+
+class Command(BaseCommand):
+    help = "Recalcula os totais persistidos em History a partir dos registros de Intake e IntakeArchive"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="users",
+            help="Restringe o recálculo ao(s) usuário(s) informado(s)"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Quantidade de dias do histórico atualizados por transação"
+        )
+
+    def handle(self, *args, **options):
+        queryset = History.objects.all()
+        if options["users"]:
+            queryset = queryset.filter(user_id__in=options["users"])
+
+        bounds = queryset.aggregate(first=Min("pk"), last=Max("pk"))
+        if bounds["first"] is None:
+            self.stdout.write("Nenhum histórico para recalcular")
+            return
+
+        intakes = Intake.objects.filter(history_id=OuterRef("pk")).order_by().values("history_id")
+        archive = IntakeArchive.objects.filter(history_id=OuterRef("pk"))
+        integer = models.IntegerField()
+
+        # Dias arquivados somam os consumos de IntakeArchive aos que ainda estão em Intake
+        totals = {
+            "amount_taken": Coalesce(
+                Subquery(intakes.annotate(total=Sum("quantity")).values("total")),
+                Value(0),
+                output_field=integer
+            ) + Coalesce(Subquery(archive.values("total")), Value(0), output_field=integer),
+            "intake_count": Coalesce(
+                Subquery(intakes.annotate(count=Count("pk")).values("count")),
+                Value(0)
+            ) + Coalesce(Subquery(archive.values("count")), Value(0)),
+        }
+
+        # Atualiza em faixas de id para não manter a tabela travada por muito tempo
+        updated = 0
+        batch_size = max(options["batch_size"], 1)
+        for start in range(bounds["first"], bounds["last"] + 1, batch_size):
+            with transaction.atomic():
+                batch = queryset.filter(pk__gte=start, pk__lt=start + batch_size)
+                updated += batch.update(**totals)
+                batch.update(progress=progress_of(F("amount_taken")))
+
+        self.stdout.write(self.style.SUCCESS(f"{updated} dia(s) do histórico recalculado(s)"))
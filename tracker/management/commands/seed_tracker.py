@@ -0,0 +1,72 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tracker.models import User, History, Intake, progress_value
+from tracker.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Popula o banco com usuários, dias de histórico e consumos sintéticos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100, help="Quantidade de usuários")
+        parser.add_argument("--days", type=int, default=30, help="Dias de histórico por usuário")
+        parser.add_argument("--intakes", type=int, default=8, help="Consumos por dia")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Linhas por bulk_create")
+        parser.add_argument("--seed", type=int, default=0, help="Semente do gerador aleatório")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        today = timezone.localdate()
+
+        users = User.objects.bulk_create(
+            [
+                User(name=f"Usuário {index}", weight_grams=rng.randint(45, 120) * 1000)
+                for index in range(options["users"])
+            ],
+            batch_size=batch_size
+        )
+
+        total_intakes = 0
+        # Agrupa usuários para que cada bulk_create grave cerca de batch_size dias
+        users_per_chunk = max(batch_size // max(options["days"], 1), 1)
+        for first in range(0, len(users), users_per_chunk):
+            history = []
+            quantities = []
+            for user in users[first:first + users_per_chunk]:
+                for offset in range(options["days"]):
+                    day = [rng.choice((150, 200, 250, 300, 500)) for _ in range(options["intakes"])]
+                    quantities.append(day)
+
+                    # Os totais são preenchidos aqui pois bulk_create não passa por Intake.save
+                    history.append(History(
+                        user_id=user,
+                        goal=user.daily_goal,
+                        date=today - timedelta(days=offset),
+                        amount_taken=sum(day),
+                        intake_count=len(day),
+                        progress=progress_value(sum(day), user.daily_goal)
+                    ))
+
+            history = History.objects.bulk_create(history, batch_size=batch_size)
+
+            intakes = Intake.objects.bulk_create(
+                [
+                    Intake(history_id=point, quantity=quantity)
+                    for point, day in zip(history, quantities)
+                    for quantity in day
+                ],
+                batch_size=batch_size
+            )
+            total_intakes += len(intakes)
+
+        # Recalcula tudo, evitando um IN com todos os usuários criados
+        rebuild_stats()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(users)} usuário(s), {len(users) * options['days']} dia(s) e {total_intakes} consumo(s) criados"
+        ))
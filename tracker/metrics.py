@@ -0,0 +1,133 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# Limites (em segundos) dos histogramas de tempo e (em unidades) do de consultas
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """
+    Histograma cumulativo no formato do Prometheus
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list:
+        lines = []
+        cumulative = 0
+        for bucket, count in zip((*self.buckets, "+Inf"), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bucket}"}} {cumulative}')
+
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+
+        return lines
+
+
+class Registry:
+    """
+    Métricas agregadas por rota, mantidas em memória no processo
+    """
+
+    histograms = {
+        "tracker_request_duration_seconds": ("Tempo total da requisição", TIME_BUCKETS),
+        "tracker_request_db_seconds": ("Tempo gasto em consultas ao banco", TIME_BUCKETS),
+        "tracker_request_render_seconds": ("Tempo de renderização da resposta", TIME_BUCKETS),
+        "tracker_request_queries": ("Consultas ao banco por requisição", QUERY_BUCKETS),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+        self.requests = {}
+
+    def observe(self, route: str, status: int, values: dict):
+        with self.lock:
+            self.requests[(route, status)] = self.requests.get((route, status), 0) + 1
+
+            for name, value in values.items():
+                key = (name, route)
+                if key not in self.series:
+                    self.series[key] = Histogram(self.histograms[name][1])
+                self.series[key].observe(value)
+
+    def render(self) -> str:
+        with self.lock:
+            lines = [
+                "# HELP tracker_requests_total Requisições atendidas",
+                "# TYPE tracker_requests_total counter",
+            ]
+            for (route, status), count in sorted(self.requests.items()):
+                lines.append(f'tracker_requests_total{{route="{route}",status="{status}"}} {count}')
+
+            for name, (description, _) in self.histograms.items():
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} histogram")
+                for (series, route), histogram in sorted(self.series.items()):
+                    if series == name:
+                        lines.extend(histogram.render(name, f'route="{route}"'))
+
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+            self.requests.clear()
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    """
+    Medições da requisição em andamento
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_started = None
+        self.render_time = 0.0
+
+
+current = ContextVar("tracker_request_metrics", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper instalado nas conexões. Fora de uma requisição medida apenas repassa a consulta
+    """
+
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def install(connection, **kwargs):
+    """
+    Adiciona o wrapper à conexão, uma única vez. Usado também como receiver de connection_created
+    """
+
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
@@ -0,0 +1,109 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from tracker.metrics import RequestMetrics, current, install, registry
+
+logger = logging.getLogger("tracker.metrics")
+
+
+class RequestMetricsMiddleware:
+    """
+    Mede, por requisição, quantidade e tempo das consultas ao banco, tempo de renderização
+    e tempo total. Publica os valores no header Server-Timing, no log "tracker.metrics" e
+    nos histogramas servidos em /metrics/.
+
+    Com TRACKER_REQUEST_METRICS desligado o Django descarta o middleware na inicialização
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.TRACKER_REQUEST_METRICS:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+        # O wrapper consulta um ContextVar, então também mede as consultas feitas via sync_to_async
+        connection_created.connect(install, dispatch_uid="tracker.metrics.install")
+        for connection in connections.all():
+            install(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+
+        return self.finish(request, response, metrics)
+
+    def process_template_response(self, request, response):
+        # Primeiro da lista, este é o último hook antes do render das respostas do DRF
+        metrics = current.get()
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: self.rendered(metrics))
+
+        return response
+
+    @staticmethod
+    def rendered(metrics: RequestMetrics):
+        metrics.render_time = time.perf_counter() - metrics.render_started
+
+    def finish(self, request, response, metrics: RequestMetrics):
+        total = time.perf_counter() - metrics.started
+        match = request.resolver_match
+        route = match.view_name if match else "unmatched"
+
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries"',
+            f"render;dur={metrics.render_time * 1000:.2f}",
+            f"view;dur={(total - metrics.db_time - metrics.render_time) * 1000:.2f}",
+            f"total;dur={total * 1000:.2f}",
+        ])
+
+        registry.observe(route, response.status_code, {
+            "tracker_request_duration_seconds": total,
+            "tracker_request_db_seconds": metrics.db_time,
+            "tracker_request_render_seconds": metrics.render_time,
+            "tracker_request_queries": metrics.queries,
+        })
+
+        if logger.isEnabledFor(logging.INFO):
+            data = {
+                "method": request.method,
+                "route": route,
+                "status": response.status_code,
+                "queries": metrics.queries,
+                "db_ms": round(metrics.db_time * 1000, 2),
+                "render_ms": round(metrics.render_time * 1000, 2),
+                "total_ms": round(total * 1000, 2),
+            }
+            logger.info(json.dumps(data), extra={"metrics": data})
+
+        return response
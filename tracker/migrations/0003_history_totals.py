@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:02
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_totals(apps, schema_editor):
+    History = apps.get_model('tracker', 'History')
+    Intake = apps.get_model('tracker', 'Intake')
+
+    intakes = Intake.objects.filter(history_id=OuterRef('pk')).order_by().values('history_id')
+
+    History.objects.update(
+        amount_taken=Coalesce(
+            Subquery(intakes.annotate(total=Sum('quantity')).values('total')),
+            Value(Decimal(0)),
+            output_field=models.DecimalField(max_digits=8, decimal_places=2)
+        ),
+        intake_count=Coalesce(
+            Subquery(intakes.annotate(count=Count('pk')).values('count')),
+            Value(0)
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0002_history_intake_delete_waterintake'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='history',
+            name='amount_taken',
+            field=models.DecimalField(blank=True, decimal_places=2, default=Decimal('0'), editable=False, help_text='Total consumido no dia em ML', max_digits=8, verbose_name='Total consumido'),
+        ),
+        migrations.AddField(
+            model_name='history',
+            name='intake_count',
+            field=models.PositiveIntegerField(blank=True, default=0, editable=False, help_text='Número de consumos registrados no dia', verbose_name='Quantidade de consumos'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
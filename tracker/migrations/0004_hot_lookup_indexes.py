@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0003_history_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='history',
+            index=models.Index(fields=['user_id', '-date'], name='history_user_date_desc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='intake',
+            index=models.Index(fields=['history_id', 'quantity'], name='intake_history_quantity_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:06
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0004_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='intake',
+            name='client_key',
+            field=models.CharField(blank=True, help_text='Chave gerada pelo aplicativo para tornar a sincronização idempotente', max_length=64, null=True, unique=True, verbose_name='Chave do cliente'),
+        ),
+        migrations.AlterField(
+            model_name='history',
+            name='date',
+            field=models.DateField(blank=True, default=django.utils.timezone.localdate, editable=False, help_text='Data', verbose_name='Data'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:10
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0005_intake_client_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Streak',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current', models.PositiveIntegerField(blank=True, default=0, help_text="Dias seguidos com meta batida terminando em 'last_date'", verbose_name='Sequência atual')),
+                ('longest', models.PositiveIntegerField(blank=True, default=0, verbose_name='Maior sequência')),
+                ('last_date', models.DateField(blank=True, null=True, verbose_name='Último dia com meta batida')),
+                ('user_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='streak', to='tracker.user', verbose_name='Usuário')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Rollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Semana'), ('month', 'Mês')], max_length=5, verbose_name='Período')),
+                ('start', models.DateField(help_text='Primeiro dia da semana (segunda-feira) ou do mês', verbose_name='Início')),
+                ('total', models.DecimalField(blank=True, decimal_places=2, default=Decimal('0'), help_text='Total consumido no período em ML', max_digits=10, verbose_name='Total consumido')),
+                ('days', models.PositiveIntegerField(blank=True, default=0, verbose_name='Dias registrados')),
+                ('days_reached', models.PositiveIntegerField(blank=True, default=0, verbose_name='Dias com meta batida')),
+                ('user_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='tracker.user', verbose_name='Usuário')),
+            ],
+            options={
+                'unique_together': {('user_id', 'period', 'start')},
+            },
+        ),
+    ]
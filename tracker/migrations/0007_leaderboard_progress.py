@@ -0,0 +1,81 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:12
+
+import calendar
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F, Max, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, TruncMonth, TruncWeek
+
+
+def fill_progress(apps, schema_editor):
+    History = apps.get_model('tracker', 'History')
+    Rollup = apps.get_model('tracker', 'Rollup')
+
+    # Meta zero vira NULL na divisão (NullIf) e o Coalesce devolve progresso 0, como em progress_of
+    History.objects.update(
+        progress=Coalesce(
+            ExpressionWrapper(
+                Cast('amount_taken', models.FloatField()) * 100 / NullIf(F('goal'), Value(0)),
+                output_field=models.FloatField()
+            ),
+            Value(0.0),
+            output_field=models.FloatField()
+        )
+    )
+
+    # Maior meta diária de cada usuário por semana (segunda-feira) e por mês, em uma consulta agrupada por período
+    daily_goals = {}
+    for period, trunc in (('week', TruncWeek), ('month', TruncMonth)):
+        grouped = History.objects.annotate(
+            start=trunc('date')
+        ).values('user_id', 'start').annotate(goal=Max('goal')).values_list('user_id', 'start', 'goal')
+        for user_id, start, goal in grouped:
+            daily_goals[(user_id, period, start)] = goal
+
+    rollups = list(Rollup.objects.all())
+    for rollup in rollups:
+        if rollup.period == 'week':
+            length = 7
+        else:
+            length = calendar.monthrange(rollup.start.year, rollup.start.month)[1]
+
+        daily_goal = daily_goals.get((rollup.user_id_id, rollup.period, rollup.start)) or Decimal(0)
+
+        rollup.goal = daily_goal * length
+        rollup.progress = float(rollup.total * 100 / rollup.goal) if rollup.goal else 0
+
+    Rollup.objects.bulk_update(rollups, ['goal', 'progress'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0006_rollup_streak'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='history',
+            name='progress',
+            field=models.FloatField(blank=True, default=0, editable=False, help_text='Percentual da meta atingido, usado no ranking do dia', verbose_name='Progresso'),
+        ),
+        migrations.AddField(
+            model_name='rollup',
+            name='goal',
+            field=models.DecimalField(blank=True, decimal_places=2, default=Decimal('0'), help_text='Meta diária multiplicada pela quantidade de dias do período, em ML', max_digits=10, verbose_name='Meta'),
+        ),
+        migrations.AddField(
+            model_name='rollup',
+            name='progress',
+            field=models.FloatField(blank=True, default=0, help_text='Percentual da meta do período atingido, usado no ranking', verbose_name='Progresso'),
+        ),
+        migrations.AddIndex(
+            model_name='history',
+            index=models.Index(fields=['date', '-progress', 'user_id'], name='history_date_progress_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rollup',
+            index=models.Index(fields=['period', 'start', '-progress', 'user_id'], name='rollup_period_progress_idx'),
+        ),
+        migrations.RunPython(fill_progress, migrations.RunPython.noop),
+    ]
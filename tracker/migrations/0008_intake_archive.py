@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:25
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0007_leaderboard_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntakeArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField(help_text='Lista JSON de [id, quantidade] comprimida com zlib', verbose_name='Consumos')),
+                ('count', models.PositiveIntegerField(blank=True, default=0, verbose_name='Quantidade de consumos')),
+                ('total', models.DecimalField(blank=True, decimal_places=2, default=Decimal('0'), help_text='Soma dos consumos arquivados em ML', max_digits=8, verbose_name='Total arquivado')),
+                ('archived_at', models.DateTimeField(auto_now=True, verbose_name='Arquivado em')),
+                ('history_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='intake_archive', to='tracker.history', verbose_name='Histórico')),
+            ],
+        ),
+    ]
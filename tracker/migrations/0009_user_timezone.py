@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:27
+
+from django.db import migrations, models
+import tracker.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0008_intake_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='timezone',
+            field=models.CharField(default=tracker.models.default_timezone, help_text='Fuso IANA (ex.: America/Sao_Paulo) que define o dia de cada consumo', max_length=64, verbose_name='Fuso horário'),
+        ),
+    ]
@@ -0,0 +1,168 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:12
+
+import calendar
+import json
+import zlib
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, ExpressionWrapper, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round, TruncMonth, TruncWeek
+
+# Colunas em ML que passam de DecimalField para IntegerField
+MILLILITERS = [
+    ('Intake', 'quantity'),
+    ('History', 'goal'),
+    ('History', 'amount_taken'),
+    ('IntakeArchive', 'total'),
+    ('Rollup', 'total'),
+    ('Rollup', 'goal'),
+]
+
+
+def weight_to_grams(apps, schema_editor):
+    User = apps.get_model('tracker', 'User')
+    User.objects.update(weight_grams=Round(F('weight') * 1000))
+
+
+def grams_to_weight(apps, schema_editor):
+    User = apps.get_model('tracker', 'User')
+    User.objects.update(weight=F('weight_grams') / 1000.0)
+
+
+def round_milliliters(apps, schema_editor):
+    """
+    Arredonda frações de ML antes da troca de tipo e regrava os arquivos com quantidades inteiras.
+    Os totais de History e dos consolidados são refeitos a partir dos consumos já arredondados,
+    já que a soma dos arredondamentos difere do arredondamento da soma (2 x 250,5 = 502, não 501)
+    """
+
+    History = apps.get_model('tracker', 'History')
+    Intake = apps.get_model('tracker', 'Intake')
+    IntakeArchive = apps.get_model('tracker', 'IntakeArchive')
+    Rollup = apps.get_model('tracker', 'Rollup')
+
+    for model_name, field in MILLILITERS:
+        apps.get_model('tracker', model_name).objects.update(**{field: Round(F(field))})
+
+    for archive in IntakeArchive.objects.iterator(chunk_size=1000):
+        # Metade para cima, como o ROUND do banco aplicado a Intake.quantity
+        intakes = [
+            [pk, int(Decimal(str(quantity)).quantize(Decimal(1), rounding=ROUND_HALF_UP))]
+            for pk, quantity in json.loads(zlib.decompress(archive.data))
+        ]
+        archive.data = zlib.compress(json.dumps(intakes).encode())
+        archive.total = sum(quantity for _, quantity in intakes)
+        archive.save(update_fields=['data', 'total'])
+
+    # Mesmo recálculo de reconcile_totals: consumos em Intake somados aos arquivados
+    intakes = Intake.objects.filter(history_id=OuterRef('pk')).order_by().values('history_id')
+    archive = IntakeArchive.objects.filter(history_id=OuterRef('pk'))
+    integer = models.IntegerField()
+    History.objects.update(
+        amount_taken=Coalesce(
+            Subquery(intakes.annotate(total=Sum('quantity')).values('total')),
+            Value(0),
+            output_field=integer
+        ) + Coalesce(Subquery(archive.values('total')), Value(0), output_field=integer)
+    )
+    History.objects.update(
+        progress=Coalesce(
+            ExpressionWrapper(
+                Cast('amount_taken', models.FloatField()) * 100 / NullIf(F('goal'), Value(0)),
+                output_field=models.FloatField()
+            ),
+            Value(0.0),
+            output_field=models.FloatField()
+        )
+    )
+
+    # Consolidados refeitos a partir de History, com uma consulta agrupada por período como em rebuild_rollups
+    totals = {}
+    for period, trunc in (('week', TruncWeek), ('month', TruncMonth)):
+        rows = History.objects.annotate(start=trunc('date')).order_by().values('user_id', 'start').annotate(
+            total=Sum('amount_taken'),
+            days_reached=Count('pk', filter=Q(amount_taken__gte=F('goal'))),
+            daily_goal=Max('goal')
+        )
+        for row in rows.iterator(chunk_size=1000):
+            totals[(row['user_id'], period, row['start'])] = row
+
+    rollups = list(Rollup.objects.all())
+    for rollup in rollups:
+        row = totals.get((rollup.user_id_id, rollup.period, rollup.start))
+        if row is None:
+            continue
+
+        if rollup.period == 'week':
+            length = 7
+        else:
+            length = calendar.monthrange(rollup.start.year, rollup.start.month)[1]
+
+        rollup.total = row['total']
+        rollup.days_reached = row['days_reached']
+        rollup.goal = row['daily_goal'] * length
+        rollup.progress = float(rollup.total * 100 / rollup.goal) if rollup.goal else 0
+
+    Rollup.objects.bulk_update(rollups, ['total', 'days_reached', 'goal', 'progress'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0009_user_timezone'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='weight',
+            field=models.DecimalField(decimal_places=2, help_text='Peso em KG', max_digits=5, null=True, verbose_name='Peso'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='weight_grams',
+            field=models.PositiveIntegerField(null=True, verbose_name='Peso'),
+        ),
+        migrations.RunPython(weight_to_grams, grams_to_weight),
+        migrations.RemoveField(
+            model_name='user',
+            name='weight',
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='weight_grams',
+            field=models.PositiveIntegerField(help_text="Peso em gramas. A API o expõe em KG, no campo 'weight'", verbose_name='Peso'),
+        ),
+        migrations.RunPython(round_milliliters, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='history',
+            name='amount_taken',
+            field=models.IntegerField(blank=True, default=0, editable=False, help_text='Total consumido no dia em ML', verbose_name='Total consumido'),
+        ),
+        migrations.AlterField(
+            model_name='history',
+            name='goal',
+            field=models.IntegerField(help_text='Meta do dia em ML', verbose_name='Meta'),
+        ),
+        migrations.AlterField(
+            model_name='intake',
+            name='quantity',
+            field=models.IntegerField(help_text='Quantidade em ML', verbose_name='Quantidade'),
+        ),
+        migrations.AlterField(
+            model_name='intakearchive',
+            name='total',
+            field=models.IntegerField(blank=True, default=0, help_text='Soma dos consumos arquivados em ML', verbose_name='Total arquivado'),
+        ),
+        migrations.AlterField(
+            model_name='rollup',
+            name='goal',
+            field=models.IntegerField(blank=True, default=0, help_text='Meta diária multiplicada pela quantidade de dias do período, em ML', verbose_name='Meta'),
+        ),
+        migrations.AlterField(
+            model_name='rollup',
+            name='total',
+            field=models.IntegerField(blank=True, default=0, help_text='Total consumido no período em ML', verbose_name='Total consumido'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:47
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0010_integer_milliliters'),
+    ]
+
+    operations = [
+        # Sem default ao adicionar, para que os consumos existentes fiquem sem horário em vez de
+        # receberem o momento da migração
+        migrations.AddField(
+            model_name='intake',
+            name='created_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Momento do consumo. Vazio nos consumos anteriores a este campo', null=True, verbose_name='Registrado em'),
+        ),
+        migrations.AlterField(
+            model_name='intake',
+            name='created_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, editable=False, help_text='Momento do consumo. Vazio nos consumos anteriores a este campo', null=True, verbose_name='Registrado em'),
+        ),
+        migrations.AddIndex(
+            model_name='intake',
+            index=models.Index(fields=['history_id', 'created_at'], name='intake_history_created_idx'),
+        ),
+    ]
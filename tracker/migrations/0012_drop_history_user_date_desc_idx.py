@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:56
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0011_intake_created_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='history',
+            name='history_user_date_desc_idx',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0012_drop_history_user_date_desc_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='intakearchive',
+            name='data',
+            field=models.BinaryField(help_text='Lista JSON de [id, quantidade, registrado em] comprimida com zlib', verbose_name='Consumos'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:07
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat, StrIndex, Substr
+
+
+def scope_keys(apps, schema_editor):
+    """
+    Prefixa as chaves já gravadas com o id do usuário do dia, no formato de Intake.scoped_key
+    """
+
+    History = apps.get_model('tracker', 'History')
+    Intake = apps.get_model('tracker', 'Intake')
+
+    user_id = Subquery(History.objects.filter(pk=OuterRef('history_id')).values('user_id')[:1])
+    Intake.objects.filter(client_key__isnull=False).update(
+        client_key=Concat(
+            Cast(user_id, models.CharField()), Value(':'), F('client_key'), output_field=models.CharField()
+        )
+    )
+
+
+def unscope_keys(apps, schema_editor):
+    Intake = apps.get_model('tracker', 'Intake')
+    Intake.objects.filter(client_key__contains=':').update(
+        client_key=Substr('client_key', StrIndex('client_key', Value(':')) + 1)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0013_intakearchive_timestamps'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='intake',
+            name='client_key',
+            field=models.CharField(blank=True, help_text="Chave gerada pelo aplicativo, prefixada pelo id do usuário ('<usuário>:<chave>'), para tornar a sincronização idempotente", max_length=96, null=True, unique=True, verbose_name='Chave do cliente'),
+        ),
+        migrations.RunPython(scope_keys, unscope_keys),
+    ]
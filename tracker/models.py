@@ -1,7 +1,22 @@
+import calendar
+import json
+import zlib
+from datetime import datetime
+from zoneinfo import ZoneInfo
 from _decimal import Decimal
 
-from django.db import models
-from django.db.models import Sum
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf
+from django.utils import timezone
+
+from tracker.cache import invalidate_resume, invalidate_user_timezone
+from tracker.goals import get_goal_formula
+
+
+def default_timezone():
+    return settings.TRACKER_DEFAULT_USER_TIMEZONE
 
 
 class User(models.Model):
@@ -10,11 +25,17 @@ class User(models.Model):
     """
 
     name = models.CharField(max_length=128, null=False, blank=False)
-    weight = models.DecimalField(
+    weight_grams = models.PositiveIntegerField(
         verbose_name="Peso",
-        max_digits=5,
-        decimal_places=2,
-        help_text="Peso em KG",
+        help_text="Peso em gramas. A API o expõe em KG, no campo 'weight'",
+        null=False,
+        blank=False
+    )
+    timezone = models.CharField(
+        verbose_name="Fuso horário",
+        max_length=64,
+        default=default_timezone,
+        help_text="Fuso IANA (ex.: America/Sao_Paulo) que define o dia de cada consumo",
         null=False,
         blank=False
     )
@@ -22,21 +43,115 @@ class User(models.Model):
     @property
     def daily_goal(self):
         """
-        Retorna a meta diária de consumo de água. Resultado em ML
+        Retorna a meta diária de consumo de água. Resultado em ML inteiros
+        """
+
+        # Fórmula configurada em TRACKER_GOAL_FORMULA, por padrão Peso em KG * 35ML
+        return get_goal_formula().compute(self.weight_grams)
+
+    def local_date(self, moment=None):
         """
+        Dia do histórico no fuso do usuário. Por padrão, o dia atual
+        """
+
+        return timezone.localdate(moment, ZoneInfo(self.timezone))
 
-        # Fórmula: Peso em KG * 35ML
-        return self.weight * 35
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            invalidate_user_timezone(self.pk)
 
     def __str__(self):
         return self.name
 
 
+def progress_of(amount, goal=F('goal')):
+    """
+    Expressão do percentual da meta atingido, calculada em ponto flutuante para ordenar rankings.
+    Com meta zero o progresso é 0
+    """
+
+    return Coalesce(
+        ExpressionWrapper(
+            Cast(amount, models.FloatField()) * 100 / NullIf(goal, Value(0)),
+            output_field=models.FloatField()
+        ),
+        Value(0.0),
+        output_field=models.FloatField()
+    )
+
+
+def percent_of(amount: int, goal: int) -> Decimal:
+    """
+    Percentual da meta atingido com duas casas, arredondado como Decimal (metade para o par).
+    Com meta zero o percentual é 0
+    """
+
+    if not goal:
+        return Decimal('0.00')
+
+    # Decimal mantém as duas casas do percentual (10.20, não 10.2)
+    return round(Decimal(amount * 100) / goal, 2)
+
+
+def progress_value(amount, goal) -> float:
+    """
+    Mesmo cálculo de progress_of, para totais já em memória
+    """
+
+    return float(amount * 100 / goal) if goal else 0.0
+
+
+class HistoryQuerySet(models.QuerySet):
+    @staticmethod
+    def summary_annotations() -> dict:
+        """
+        Campos calculados do resumo, resolvidos no próprio SQL
+        """
+
+        return {
+            'annotated_amount_left': Greatest(
+                F('goal') - F('amount_taken'),
+                Value(0),
+                output_field=models.IntegerField()
+            ),
+            'annotated_reached_goal': Case(
+                When(amount_taken__gte=F('goal'), then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField()
+            ),
+        }
+
+    def with_summary(self, annotations=None, intakes: bool = True):
+        """
+        Calcula os campos do resumo no próprio SQL e carrega os consumos em uma única consulta.
+        Os consumos arquivados vêm no mesmo SELECT do dia
+
+        'annotations' restringe os campos calculados aos nomes informados e intakes=False
+        dispensa o carregamento dos consumos
+        """
+
+        summary = self.summary_annotations()
+        if annotations is not None:
+            summary = {name: summary[name] for name in annotations}
+
+        queryset = self.annotate(**summary)
+
+        if intakes:
+            queryset = queryset.select_related('intake_archive').prefetch_related(
+                models.Prefetch('intake', queryset=Intake.objects.order_by('pk'))
+            )
+
+        return queryset
+
+
 class History(models.Model):
     """
     Registra o consumo de água de um dia para um usuário
     """
 
+    objects = HistoryQuerySet.as_manager()
+
     user_id = models.ForeignKey(
         User,
         verbose_name="Usuário",
@@ -45,39 +160,44 @@ class History(models.Model):
         null=False,
         blank=False
     )
-    goal = models.DecimalField(
+    goal = models.IntegerField(
         verbose_name="Meta",
-        max_digits=6,
-        decimal_places=2,
         help_text="Meta do dia em ML",
         null=False,
         blank=False
     )
     date = models.DateField(
         verbose_name="Data",
-        auto_now_add=True,
+        default=timezone.localdate,
+        editable=False,
         help_text="Data",
         null=False,
         blank=True
     )
-
-    @property
-    def amount_taken(self):
-        """
-        Retorna o total de água consumido no dia
-        """
-
-        total = self.intake.aggregate(
-            amount=Sum(
-                'quantity',
-                output_field=models.DecimalField(
-                    max_digits=6,
-                    decimal_places=2
-                )
-            )
-        )
-
-        return total['amount'] or Decimal(0)
+    amount_taken = models.IntegerField(
+        verbose_name="Total consumido",
+        help_text="Total consumido no dia em ML",
+        default=0,
+        editable=False,
+        null=False,
+        blank=True
+    )
+    intake_count = models.PositiveIntegerField(
+        verbose_name="Quantidade de consumos",
+        help_text="Número de consumos registrados no dia",
+        default=0,
+        editable=False,
+        null=False,
+        blank=True
+    )
+    progress = models.FloatField(
+        verbose_name="Progresso",
+        help_text="Percentual da meta atingido, usado no ranking do dia",
+        default=0,
+        editable=False,
+        null=False,
+        blank=True
+    )
 
     @property
     def amount_left(self):
@@ -85,13 +205,12 @@ class History(models.Model):
         Retorna o valor faltante para bater a meta do dia
         """
 
-        amount_left = self.goal - self.amount_taken
+        # Valor já calculado pelo banco em HistoryQuerySet.with_summary
+        if 'annotated_amount_left' in self.__dict__:
+            return self.annotated_amount_left
 
         # Caso a meta seja passada (mais água consumida), é retornado 0
-        if amount_left < 0:
-            return Decimal(0)
-
-        return amount_left
+        return max(self.goal - self.amount_taken, 0)
 
     @property
     def reached_goal(self):
@@ -99,6 +218,9 @@ class History(models.Model):
         Retorna se a meta do dia foi batida ou não
         """
 
+        if 'annotated_reached_goal' in self.__dict__:
+            return self.annotated_reached_goal
+
         # Se a quantia restante for igual a zero, a meta foi batida
         return self.amount_left == 0
 
@@ -108,13 +230,64 @@ class History(models.Model):
         Calcula o percentual da meta já bebido
         """
 
-        return round((self.amount_taken * 100) / self.goal, 2)
+        # Calculado sempre em Python: o ROUND do SQL arredondaria as metades de outra forma
+        return percent_of(self.amount_taken, self.goal)
+
+    def all_intakes(self) -> list:
+        """
+        Consumos do dia, incluindo os já movidos para IntakeArchive
+        """
+
+        try:
+            archived = self.intake_archive.unpack()
+        except IntakeArchive.DoesNotExist:
+            archived = []
+
+        return archived + list(self.intake.all())
 
     def __str__(self):
         return f"Consumo do dia {self.date} por {self.user_id}"
 
     class Meta:
         unique_together = [['user_id', 'date']]
+        indexes = [
+            # Ranking do dia
+            models.Index(fields=['date', '-progress', 'user_id'], name='history_date_progress_idx'),
+        ]
+
+
+def update_totals(history_id, quantity, count):
+    """
+    Soma 'quantity' e 'count' aos totais do dia de forma atômica (valores negativos subtraem)
+    """
+
+    History.objects.filter(pk=history_id).update(
+        amount_taken=F('amount_taken') + quantity,
+        intake_count=F('intake_count') + count,
+        progress=progress_of(F('amount_taken') + quantity)
+    )
+
+
+class IntakeQuerySet(models.QuerySet):
+    def remove(self):
+        """
+        Remove os consumos e decrementa os totais dos dias afetados. delete() não altera os
+        totais, pois é usado quando os consumos saem junto com o dia ou vão para IntakeArchive
+        """
+
+        with transaction.atomic(savepoint=False):
+            days = list(
+                self.order_by()
+                .values('history_id', 'history_id__user_id', 'history_id__date')
+                .annotate(total=Sum('quantity'), count=Count('pk'))
+            )
+            deleted = self.delete()
+
+            for day in days:
+                update_totals(day['history_id'], -day['total'], -day['count'])
+            invalidate_resume(*[(day['history_id__user_id'], day['history_id__date']) for day in days])
+
+            return deleted
 
 
 class Intake(models.Model):
@@ -122,6 +295,8 @@ class Intake(models.Model):
     Registra o consumo de água para um usuário
     """
 
+    objects = IntakeQuerySet.as_manager()
+
     history_id = models.ForeignKey(
         History,
         verbose_name="Histórico",
@@ -130,14 +305,304 @@ class Intake(models.Model):
         null=False,
         blank=False
     )
-    quantity = models.DecimalField(
+    quantity = models.IntegerField(
         verbose_name="Quantidade",
-        max_digits=6,
-        decimal_places=2,
         help_text="Quantidade em ML",
         null=False,
         blank=False
     )
+    client_key = models.CharField(
+        verbose_name="Chave do cliente",
+        max_length=96,
+        unique=True,
+        help_text="Chave gerada pelo aplicativo, prefixada pelo id do usuário ('<usuário>:<chave>'), "
+                  "para tornar a sincronização idempotente",
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Registrado em",
+        default=timezone.now,
+        editable=False,
+        help_text="Momento do consumo. Vazio nos consumos anteriores a este campo",
+        null=True,
+        blank=True
+    )
+
+    @staticmethod
+    def scoped_key(user_id, key: str) -> str:
+        """
+        client_key de uma chave do aplicativo. As chaves só precisam ser únicas por usuário
+        """
+
+        return f"{user_id}:{key}"
+
+    def save(self, *args, **kwargs):
+        """
+        Ao registrar um novo consumo, incrementa os totais do dia de forma atômica.
+        Ao editar, aplica a diferença da quantidade, inclusive quando o consumo muda de dia
+        """
+
+        # Sem savepoint, que somaria idas ao banco dentro da transação do drink
+        with transaction.atomic(savepoint=False):
+            previous = None
+            if self.pk is not None and not kwargs.get('force_insert'):
+                previous = Intake.objects.select_for_update().filter(pk=self.pk).values(
+                    'history_id', 'history_id__user_id', 'history_id__date', 'quantity'
+                ).first()
+
+            super().save(*args, **kwargs)
+
+            days = [(self.history_id.user_id_id, self.history_id.date)]
+            if previous is None:
+                update_totals(self.history_id_id, self.quantity, 1)
+            elif previous['history_id'] != self.history_id_id:
+                update_totals(previous['history_id'], -previous['quantity'], -1)
+                update_totals(self.history_id_id, self.quantity, 1)
+                days.append((previous['history_id__user_id'], previous['history_id__date']))
+            elif previous['quantity'] != self.quantity:
+                update_totals(self.history_id_id, self.quantity - previous['quantity'], 0)
+
+            invalidate_resume(*days)
+
+    def delete(self, *args, **kwargs):
+        """
+        Ao remover um consumo, decrementa os totais do dia de forma atômica
+        """
+
+        with transaction.atomic(savepoint=False):
+            update_totals(self.history_id_id, -self.quantity, -1)
+            invalidate_resume((self.history_id.user_id_id, self.history_id.date))
+
+            return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"Quantidade: {self.quantity}ML"
+
+    class Meta:
+        indexes = [
+            # Permite somar os consumos de um dia apenas pelo índice
+            models.Index(fields=['history_id', 'quantity'], name='intake_history_quantity_idx'),
+            # Série temporal dos consumos ao longo do dia
+            models.Index(fields=['history_id', 'created_at'], name='intake_history_created_idx'),
+        ]
+
+
+class IntakeArchive(models.Model):
+    """
+    Consumos de um dia antigo compactados em uma única linha. Criado pelo comando archive_intakes
+    """
+
+    history_id = models.OneToOneField(
+        History,
+        verbose_name="Histórico",
+        related_name="intake_archive",
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False
+    )
+    data = models.BinaryField(
+        verbose_name="Consumos",
+        help_text="Lista JSON de [id, quantidade, registrado em] comprimida com zlib",
+        null=False,
+        blank=False
+    )
+    count = models.PositiveIntegerField(
+        verbose_name="Quantidade de consumos",
+        default=0,
+        null=False,
+        blank=True
+    )
+    total = models.IntegerField(
+        verbose_name="Total arquivado",
+        help_text="Soma dos consumos arquivados em ML",
+        default=0,
+        null=False,
+        blank=True
+    )
+    archived_at = models.DateTimeField(
+        verbose_name="Arquivado em",
+        auto_now=True
+    )
+
+    @staticmethod
+    def pack(intakes: list) -> bytes:
+        """
+        Compacta os consumos informados como (id, quantidade, registrado em)
+        """
+
+        return zlib.compress(json.dumps([
+            [pk, quantity, created_at.isoformat() if created_at else None]
+            for pk, quantity, created_at in intakes
+        ]).encode())
+
+    @staticmethod
+    def decode(data) -> list:
+        """
+        Consumos compactados por pack, como (id, quantidade, registrado em). Arquivos gravados
+        antes de o horário ser guardado têm apenas [id, quantidade] e vêm sem horário
+        """
+
+        return [
+            (row[0], row[1], datetime.fromisoformat(row[2]) if len(row) > 2 and row[2] else None)
+            for row in json.loads(zlib.decompress(data))
+        ]
+
+    def unpack(self) -> list:
+        """
+        Reconstrói os consumos arquivados como instâncias de Intake, sem acessar o banco
+        """
+
+        return [
+            Intake(pk=pk, history_id_id=self.history_id_id, quantity=quantity, created_at=created_at)
+            for pk, quantity, created_at in self.decode(self.data)
+        ]
+
+    def __str__(self):
+        return f"{self.count} consumo(s) arquivado(s) de {self.history_id}"
+
+
+class Rollup(models.Model):
+    """
+    Consolidado semanal ou mensal do consumo de um usuário, mantido a cada consumo registrado
+    """
+
+    WEEK = 'week'
+    MONTH = 'month'
+    PERIODS = [
+        (WEEK, 'Semana'),
+        (MONTH, 'Mês'),
+    ]
+
+    user_id = models.ForeignKey(
+        User,
+        verbose_name="Usuário",
+        related_name="rollups",
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False
+    )
+    period = models.CharField(
+        verbose_name="Período",
+        max_length=5,
+        choices=PERIODS,
+        null=False,
+        blank=False
+    )
+    start = models.DateField(
+        verbose_name="Início",
+        help_text="Primeiro dia da semana (segunda-feira) ou do mês",
+        null=False,
+        blank=False
+    )
+    total = models.IntegerField(
+        verbose_name="Total consumido",
+        help_text="Total consumido no período em ML",
+        default=0,
+        null=False,
+        blank=True
+    )
+    days = models.PositiveIntegerField(
+        verbose_name="Dias registrados",
+        default=0,
+        null=False,
+        blank=True
+    )
+    days_reached = models.PositiveIntegerField(
+        verbose_name="Dias com meta batida",
+        default=0,
+        null=False,
+        blank=True
+    )
+    goal = models.IntegerField(
+        verbose_name="Meta",
+        help_text="Meta diária multiplicada pela quantidade de dias do período, em ML",
+        default=0,
+        null=False,
+        blank=True
+    )
+    progress = models.FloatField(
+        verbose_name="Progresso",
+        help_text="Percentual da meta do período atingido, usado no ranking",
+        default=0,
+        null=False,
+        blank=True
+    )
+
+    @property
+    def average(self):
+        """
+        Média diária consumida nos dias registrados do período
+        """
+
+        if not self.days:
+            return Decimal(0)
+
+        return round(Decimal(self.total) / self.days, 2)
+
+    def __str__(self):
+        return f"Consolidado ({self.period}) de {self.start} por {self.user_id}"
+
+    @staticmethod
+    def length(period: str, start) -> int:
+        """
+        Quantidade de dias do período iniciado em 'start'
+        """
+
+        if period == Rollup.WEEK:
+            return 7
+
+        return calendar.monthrange(start.year, start.month)[1]
+
+    class Meta:
+        unique_together = [['user_id', 'period', 'start']]
+        indexes = [
+            # Ranking da semana/mês
+            models.Index(fields=['period', 'start', '-progress', 'user_id'], name='rollup_period_progress_idx'),
+        ]
+
+
+class Streak(models.Model):
+    """
+    Sequência de dias seguidos com a meta batida por um usuário
+    """
+
+    user_id = models.OneToOneField(
+        User,
+        verbose_name="Usuário",
+        related_name="streak",
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False
+    )
+    current = models.PositiveIntegerField(
+        verbose_name="Sequência atual",
+        help_text="Dias seguidos com meta batida terminando em 'last_date'",
+        default=0,
+        null=False,
+        blank=True
+    )
+    longest = models.PositiveIntegerField(
+        verbose_name="Maior sequência",
+        default=0,
+        null=False,
+        blank=True
+    )
+    last_date = models.DateField(
+        verbose_name="Último dia com meta batida",
+        null=True,
+        blank=True
+    )
+
+    def current_on(self, date):
+        """
+        Retorna a sequência atual vista em 'date'. Ela se mantém enquanto a meta de ontem tiver sido batida
+        """
+
+        if self.last_date and (date - self.last_date).days <= 1:
+            return self.current
+
+        return 0
+
+    def __str__(self):
+        return f"Sequência de {self.user_id}"
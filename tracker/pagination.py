@@ -0,0 +1,14 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class HistoryCursorPagination(CursorPagination):
+    """
+    Paginação por cursor do histórico. Cada página é buscada a partir da última
+    data retornada, sem OFFSET, mantendo o custo constante em históricos longos
+    """
+
+    ordering = ('date', 'id')
+    page_size = settings.TRACKER_HISTORY_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.TRACKER_HISTORY_MAX_PAGE_SIZE
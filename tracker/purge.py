@@ -0,0 +1,60 @@
+from collections import Counter
+
+from django.db import transaction
+
+from tracker.cache import invalidate_resume, invalidate_user_timezone
+from tracker.models import History, Intake, IntakeArchive, Rollup, Streak, User
+
+
+def purge_counts(user_ids) -> dict:
+    """
+    Linhas que purge_users removeria, por model, contadas sem carregar os registros
+    """
+
+    history = History.objects.filter(user_id__in=user_ids)
+
+    return {
+        User._meta.label: User.objects.filter(pk__in=user_ids).count(),
+        History._meta.label: history.count(),
+        Intake._meta.label: Intake.objects.filter(history_id__in=history.values('pk')).count(),
+        IntakeArchive._meta.label: IntakeArchive.objects.filter(history_id__in=history.values('pk')).count(),
+        Rollup._meta.label: Rollup.objects.filter(user_id__in=user_ids).count(),
+        Streak._meta.label: Streak.objects.filter(user_id__in=user_ids).count(),
+    }
+
+
+def purge_users(user_ids, batch_size: int = 1000) -> dict:
+    """
+    Remove os usuários e todo o seu histórico com DELETEs em lote
+
+    O CASCADE do Django carregaria cada History e Intake em memória antes de apagar. Aqui os
+    consumos são removidos por DELETE direto, um lote de dias por transação curta, e só então
+    os dias e os usuários. Interrompida, pode ser executada de novo para terminar a remoção.
+    Retorna a quantidade de linhas removidas por model
+    """
+
+    user_ids = list(user_ids)
+    batch_size = max(batch_size, 1)
+    deleted = Counter()
+
+    for start in range(0, len(user_ids), batch_size):
+        users = user_ids[start:start + batch_size]
+
+        history = History.objects.filter(user_id__in=users).order_by('pk')
+        while days := list(history.values_list('pk', 'user_id', 'date')[:batch_size]):
+            ids = [pk for pk, _, _ in days]
+
+            with transaction.atomic():
+                # Sem dependentes, Intake e IntakeArchive são apagados sem carregar as linhas
+                deleted.update(Intake.objects.filter(history_id__in=ids).delete()[1])
+                deleted.update(IntakeArchive.objects.filter(history_id__in=ids).delete()[1])
+                deleted.update(History.objects.filter(pk__in=ids).delete()[1])
+                invalidate_resume(*[(user_id, date) for _, user_id, date in days])
+
+        with transaction.atomic():
+            # Consolidados e sequência saem pelo CASCADE, sem dias restantes para carregar
+            deleted.update(User.objects.filter(pk__in=users).delete()[1])
+            for user_id in users:
+                invalidate_user_timezone(user_id)
+
+    return {label: count for label, count in deleted.items() if count}
@@ -0,0 +1,28 @@
+import json
+
+from rest_framework.compat import LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.renderers import JSONRenderer
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer que serializa dados já primitivos (como os de tracker.representations)
+    direto com o json da biblioteca padrão, sem passar pelo encoder do DRF. Gera os mesmos bytes.
+    Dados com outros tipos ou pedidos com indentação seguem pelo JSONRenderer
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = json.dumps(
+                data,
+                ensure_ascii=self.ensure_ascii,
+                allow_nan=not self.strict,
+                separators=SHORT_SEPARATORS if self.compact else LONG_SEPARATORS
+            )
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
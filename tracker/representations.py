@@ -0,0 +1,193 @@
+"""
+Serialização somente leitura dos endpoints mais acessados (resume, history e listagem de usuários)
+
+Monta dicts diretamente das linhas de .values(), sem a introspecção e o to_representation
+campo a campo dos serializers do DRF. A saída é idêntica à de HistorySerializer,
+DayTotalsSerializer e UserSerializer
+"""
+
+import json
+import zlib
+from collections import defaultdict
+from decimal import Decimal
+
+from tracker.goals import get_goal_formula
+from tracker.models import Intake, percent_of
+
+CENTS = Decimal('0.01')
+
+
+def decimal_string(value) -> str:
+    """
+    Mesmo formato de serializers.DecimalField com duas casas decimais
+    """
+
+    # Quantidades em ML inteiros, o caso comum, dispensam o Decimal
+    if type(value) is int:
+        return f"{value}.00"
+
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+
+    return f"{value.quantize(CENTS):f}"
+
+
+def percent_string(amount: int, goal: int) -> str:
+    return decimal_string(percent_of(amount, goal))
+
+
+# Campo da resposta: (coluna em HistoryQuerySet.with_summary, ou tupla de colunas, conversão)
+HISTORY_FIELDS = {
+    'id': ('id', None),
+    'date': ('date', lambda value: value.isoformat()),
+    'goal': ('goal', decimal_string),
+    'amount_taken': ('amount_taken', decimal_string),
+    'amount_left': ('annotated_amount_left', decimal_string),
+    # Calculado em Python, com o mesmo arredondamento de History.percent_amount
+    'percent_reached': (('amount_taken', 'goal'), percent_string),
+    'reached_goal': ('annotated_reached_goal', bool),
+}
+
+# Ordem dos campos em HistorySerializer
+HISTORY_ORDER = ['id', 'date', 'intakes', 'goal', 'amount_taken', 'amount_left', 'percent_reached', 'reached_goal']
+
+USER_VALUES = ('id', 'name', 'weight_grams', 'timezone')
+
+
+def intake_rows(history_ids: list) -> dict:
+    """
+    Consumos ainda não arquivados dos dias informados, agrupados por dia, em uma única consulta
+    """
+
+    intakes = defaultdict(list)
+    rows = Intake.objects.filter(history_id__in=history_ids).order_by('history_id', 'pk')
+    for history_id, pk, quantity in rows.values_list('history_id', 'pk', 'quantity'):
+        intakes[history_id].append({"id": pk, "quantity": decimal_string(quantity)})
+
+    return intakes
+
+
+def archived_intakes(data) -> list:
+    if data is None:
+        return []
+
+    return [
+        {"id": pk, "quantity": decimal_string(quantity)}
+        for pk, quantity, *_ in json.loads(zlib.decompress(data))
+    ]
+
+
+def selected(field: str, fields=None, intakes: bool = True) -> bool:
+    """
+    Indica se o campo faz parte da resposta. "intakes" depende apenas da expansão
+    """
+
+    if field == 'intakes':
+        return intakes
+
+    return fields is None or field in fields
+
+
+def history_queryset(queryset, fields=None, intakes: bool = True, extra: tuple = ()):
+    """
+    Linhas do histórico no formato esperado por history_data. Só calcula os campos pedidos e
+    só traz os consumos arquivados quando intakes=True. "id" e "date" sempre vêm, pois ordenam a paginação.
+    'extra' acrescenta colunas às linhas, ignoradas por history_data
+    """
+
+    columns = ['id', 'date']
+    for field in HISTORY_FIELDS:
+        if selected(field, fields):
+            column = HISTORY_FIELDS[field][0]
+            columns.extend(column if isinstance(column, tuple) else [column])
+
+    columns = list(dict.fromkeys(columns))
+    annotations = [column for column in columns if column.startswith('annotated_')]
+    if intakes:
+        columns.append('intake_archive__data')
+    columns.extend(extra)
+
+    return queryset.with_summary(annotations, intakes=False).values(*columns)
+
+
+def history_data(rows, fields=None, intakes: bool = True) -> list:
+    """
+    Equivalente a HistorySerializer(many=True).data, ou DayTotalsSerializer com intakes=False.
+    'fields' restringe os campos retornados
+    """
+
+    rows = list(rows)
+    live = intake_rows([row['id'] for row in rows]) if intakes else None
+    order = [field for field in HISTORY_ORDER if selected(field, fields, intakes)]
+
+    data = []
+    for row in rows:
+        if intakes:
+            data.append(day_data(row, order, archived_intakes(row['intake_archive__data']) + live.get(row['id'], [])))
+        else:
+            data.append(day_data(row, order))
+
+    return data
+
+
+def day_data(row: dict, order: list, intakes=None) -> dict:
+    """
+    Converte uma linha nos campos de 'order', na ordem de HISTORY_ORDER
+    """
+
+    day = {}
+    for field in order:
+        if field == 'intakes':
+            day[field] = intakes
+        else:
+            column, convert = HISTORY_FIELDS[field]
+            if isinstance(column, tuple):
+                day[field] = convert(*(row[name] for name in column))
+            else:
+                day[field] = convert(row[column]) if convert else row[column]
+
+    return day
+
+
+def empty_day(date, goal, fields=None, intakes: bool = True) -> dict:
+    """
+    Dia ainda sem registro no histórico, com progresso zero. Mesmo formato de DayTotalsSerializer
+    para um dia recém-criado, como na resposta do drink
+    """
+
+    row = {
+        'id': None,
+        'date': date,
+        'goal': goal,
+        'amount_taken': 0,
+        'annotated_amount_left': goal,
+        'annotated_reached_goal': False,
+    }
+
+    return day_data(row, [field for field in HISTORY_ORDER if selected(field, fields, intakes)], [])
+
+
+def project(day: dict, fields=None, intakes: bool = True) -> dict:
+    """
+    Recorta um dia já serializado (por exemplo, do cache do resume) nos campos pedidos
+    """
+
+    return {key: value for key, value in day.items() if selected(key, fields, intakes)}
+
+
+def user_data(rows) -> list:
+    """
+    Equivalente a UserSerializer(many=True).data
+    """
+
+    formula = get_goal_formula()
+    return [
+        {
+            "id": row['id'],
+            "name": row['name'],
+            "weight": decimal_string(Decimal(row['weight_grams']) / 1000),
+            "daily_goal": float(formula.compute(row['weight_grams'])),
+            "timezone": row['timezone'],
+        }
+        for row in rows
+    ]
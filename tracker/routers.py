@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+replica_reads = ContextVar("tracker_replica_reads", default=False)
+
+
+@contextmanager
+def read_from_replica(enabled: bool = True):
+    """
+    Direciona as leituras feitas dentro do bloco para a réplica, quando configurada
+    """
+
+    token = replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Envia para o alias "replica" as leituras das ações somente leitura. Escritas e
+    migrações ficam sempre no banco principal
+    """
+
+    replica = "replica"
+
+    def db_for_read(self, model, **hints):
+        if replica_reads.get():
+            return self.replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e principal guardam os mesmos dados
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == self.replica:
+            return False
+        return None
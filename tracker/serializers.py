@@ -1,31 +1,101 @@
+from decimal import Decimal, ROUND_HALF_UP
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from tracker.models import User, Intake, History, Rollup
+
+
+class FixedPointField(serializers.DecimalField):
+    """
+    Inteiro gravado no banco (ML, gramas) exposto na API como decimal de duas casas
+
+    'scale' converte da unidade da API para a do banco, por exemplo 1000 para KG em gramas.
+    Frações menores que a unidade do banco são arredondadas
+    """
+
+    def __init__(self, scale: int = 1, max_digits: int = 6, **kwargs):
+        self.scale = scale
+        super().__init__(max_digits=max_digits, decimal_places=2, **kwargs)
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data) * self.scale
+        return int(value.to_integral_value(rounding=ROUND_HALF_UP))
+
+    def to_representation(self, value):
+        # ML inteiros, o caso comum, dispensam o Decimal
+        coerce_to_string = getattr(self, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if self.scale == 1 and type(value) is int and coerce_to_string and not self.localize:
+            return f"{value}.00"
 
-from tracker.models import User, Intake, History
+        return super().to_representation(Decimal(value) / self.scale)
 
 
 class UserSerializer(serializers.ModelSerializer):
+    weight = FixedPointField(source='weight_grams', scale=1000, max_digits=5, min_value=0)
+    # Mantém o formato anterior ao armazenamento em ML inteiros (2625.0)
+    daily_goal = serializers.FloatField(read_only=True)
+
     class Meta:
         model = User
-        fields = ['id', 'name', 'weight', 'daily_goal']
+        fields = ['id', 'name', 'weight', 'daily_goal', 'timezone']
+
+    def validate_timezone(self, value):
+        try:
+            ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise serializers.ValidationError(f"Fuso horário '{value}' inválido")
+
+        return value
 
 
 class IntakeSerializer(serializers.ModelSerializer):
     history_id = serializers.PrimaryKeyRelatedField(queryset=History.objects.all(), write_only=True)
+    quantity = FixedPointField()
 
     class Meta:
         model = Intake
-        fields = '__all__'
+        fields = ['id', 'history_id', 'quantity']
+
+
+class DrinkSerializer(serializers.ModelSerializer):
+    """
+    Valida apenas a quantidade consumida. O dia do histórico é definido pela view
+    """
+
+    quantity = FixedPointField()
+
+    class Meta:
+        model = Intake
+        fields = ['id', 'quantity']
+
+
+class SyncIntakeSerializer(serializers.Serializer):
+    """
+    Item da sincronização em lote. Não consulta o banco, usuários e chaves são checados em lote
+    """
+
+    key = serializers.CharField(max_length=64)
+    user = serializers.IntegerField(min_value=1)
+    date = serializers.DateField()
+    quantity = FixedPointField()
+    # Momento em que o consumo foi registrado no aplicativo. Padrão: o da sincronização
+    created_at = serializers.DateTimeField(required=False)
 
 
 class HistorySerializer(serializers.ModelSerializer):
     """
     Read-Only serializer. Responsável por gerar a tela de resumo
+
+    Usar com HistoryQuerySet.with_summary para que os campos calculados venham do banco.
+    Os consumos de dias arquivados são lidos de IntakeArchive
     """
 
-    intakes = IntakeSerializer(source='intake', many=True)
-    goal = serializers.DecimalField(max_digits=6, decimal_places=2)
-    amount_taken = serializers.DecimalField(max_digits=6, decimal_places=2)
-    amount_left = serializers.DecimalField(max_digits=6, decimal_places=2)
+    intakes = IntakeSerializer(source='all_intakes', many=True)
+    goal = FixedPointField()
+    amount_taken = FixedPointField()
+    amount_left = FixedPointField()
     percent_reached = serializers.CharField(source='percent_amount')
     reached_goal = serializers.BooleanField()
 
@@ -40,4 +110,31 @@ class HistorySerializer(serializers.ModelSerializer):
             'amount_left',
             'percent_reached',
             'reached_goal',
-        ]
\ No newline at end of file
+        ]
+
+
+class DayTotalsSerializer(HistorySerializer):
+    """
+    Read-Only serializer. Totais do dia sem a lista de consumos
+    """
+
+    intakes = None
+
+    class Meta(HistorySerializer.Meta):
+        fields = [field for field in HistorySerializer.Meta.fields if field != 'intakes']
+
+
+class RollupSerializer(serializers.ModelSerializer):
+    total = FixedPointField(max_digits=10)
+    average = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        model = Rollup
+        fields = ['start', 'total', 'days', 'days_reached', 'average']
+
+
+class RankingSerializer(serializers.Serializer):
+    rank = serializers.IntegerField()
+    user = serializers.IntegerField()
+    name = serializers.CharField()
+    percent = serializers.DecimalField(max_digits=10, decimal_places=2)
@@ -0,0 +1,285 @@
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from django.db import models, transaction
+from django.db.models import Count, ExpressionWrapper, F, Max, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import ExtractMinute, Floor, Greatest, TruncHour, TruncMonth, TruncWeek
+
+from tracker.cache import invalidate_resume
+from tracker.goals import get_goal_formula
+from tracker.models import History, Intake, IntakeArchive, Rollup, Streak, User, progress_of, progress_value
+
+BATCH_SIZE = 5000
+
+# Faixas da série temporal dos consumos, em minutos
+SERIES_BUCKETS = {'hour': 60, '15min': 15}
+
+
+def period_starts(date) -> list:
+    """
+    Retorna o início da semana (segunda-feira) e do mês aos quais o dia pertence
+    """
+
+    return [
+        (Rollup.WEEK, date - timedelta(days=date.weekday())),
+        (Rollup.MONTH, date.replace(day=1)),
+    ]
+
+
+def record_intake(history: History, quantity):
+    """
+    Atualiza os consolidados e a sequência do usuário após um consumo
+
+    'history' deve refletir o dia antes do consumo (totais ainda não incrementados).
+    Idealmente chamada na mesma transação em que o consumo foi gravado
+    """
+
+    # Sem savepoint: dentro da transação do drink, um erro já desfaz tudo
+    with transaction.atomic(savepoint=False):
+        first_intake = int(history.intake_count == 0)
+        # Com meta zero, o primeiro consumo já conta como meta batida, assim como em rebuild_rollups
+        reached = int(
+            (first_intake or history.amount_taken < history.goal) and history.goal <= history.amount_taken + quantity
+        )
+
+        for period, start in period_starts(history.date):
+            # A meta do período acompanha a maior meta diária registrada nele
+            goal = history.goal * Rollup.length(period, start)
+            rollups = Rollup.objects.filter(user_id=history.user_id_id, period=period, start=start)
+            increments = {
+                'total': F('total') + quantity,
+                'days': F('days') + first_intake,
+                'days_reached': F('days_reached') + reached,
+                'goal': Greatest(F('goal'), Value(goal)),
+                'progress': progress_of(F('total') + quantity, Greatest(F('goal'), Value(goal))),
+            }
+
+            # Na maioria das vezes o período já existe e basta um UPDATE
+            if not rollups.update(**increments):
+                _, created = Rollup.objects.get_or_create(
+                    user_id_id=history.user_id_id,
+                    period=period,
+                    start=start,
+                    defaults={
+                        'total': quantity,
+                        'days': first_intake,
+                        'days_reached': reached,
+                        'goal': goal,
+                        'progress': progress_value(quantity, goal),
+                    }
+                )
+                if not created:
+                    rollups.update(**increments)
+
+        if reached:
+            advance_streak(history.user_id_id, history.date)
+
+
+def advance_streak(user_id: int, date):
+    """
+    Registra que a meta de 'date' foi batida, estendendo ou reiniciando a sequência
+    """
+
+    streak, _ = Streak.objects.select_for_update().get_or_create(user_id_id=user_id)
+
+    if streak.last_date == date:
+        return
+
+    if streak.last_date and streak.last_date > date:
+        # Dia antigo sincronizado fora de ordem, pode unir sequências
+        rebuild_streaks([user_id])
+        return
+
+    if streak.last_date == date - timedelta(days=1):
+        streak.current += 1
+    else:
+        streak.current = 1
+
+    streak.longest = max(streak.longest, streak.current)
+    streak.last_date = date
+    streak.save()
+
+
+def rebuild_rollups(user_ids=None):
+    """
+    Recalcula no banco os consolidados a partir dos totais de History
+    """
+
+    history = History.objects.all()
+    rollups = Rollup.objects.all()
+    if user_ids is not None:
+        history = history.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    rollups.delete()
+
+    for period, trunc in ((Rollup.WEEK, TruncWeek), (Rollup.MONTH, TruncMonth)):
+        rows = history.annotate(start=trunc('date')).order_by().values('user_id', 'start').annotate(
+            total=Sum('amount_taken'),
+            days=Count('pk'),
+            days_reached=Count('pk', filter=Q(amount_taken__gte=F('goal'))),
+            daily_goal=Max('goal')
+        )
+
+        batch = []
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            goal = row['daily_goal'] * Rollup.length(period, row['start'])
+            batch.append(Rollup(
+                user_id_id=row['user_id'],
+                period=period,
+                start=row['start'],
+                total=row['total'],
+                days=row['days'],
+                days_reached=row['days_reached'],
+                goal=goal,
+                progress=progress_value(row['total'], goal)
+            ))
+
+            if len(batch) >= BATCH_SIZE:
+                Rollup.objects.bulk_create(batch)
+                batch = []
+
+        Rollup.objects.bulk_create(batch)
+
+
+def rebuild_streaks(user_ids=None):
+    """
+    Recalcula as sequências percorrendo apenas os dias com meta batida, em ordem
+    """
+
+    reached = History.objects.filter(amount_taken__gte=F('goal'))
+    streaks = Streak.objects.all()
+    if user_ids is not None:
+        reached = reached.filter(user_id__in=user_ids)
+        streaks = streaks.filter(user_id__in=user_ids)
+
+    streaks.delete()
+
+    batch = []
+    streak = None
+    rows = reached.order_by('user_id', 'date').values_list('user_id', 'date')
+    for user_id, date in rows.iterator(chunk_size=BATCH_SIZE):
+        if streak is None or streak.user_id_id != user_id:
+            streak = Streak(user_id_id=user_id)
+            batch.append(streak)
+
+        if streak.last_date == date - timedelta(days=1):
+            streak.current += 1
+        else:
+            streak.current = 1
+
+        streak.longest = max(streak.longest, streak.current)
+        streak.last_date = date
+
+        # Só grava sequências de usuários já percorridos por completo
+        if len(batch) > BATCH_SIZE:
+            Streak.objects.bulk_create(batch[:-1])
+            batch = batch[-1:]
+
+    Streak.objects.bulk_create(batch)
+
+
+def rebuild_stats(user_ids=None):
+    """
+    Recalcula consolidados e sequências dos usuários informados (ou de todos)
+    """
+
+    with transaction.atomic():
+        rebuild_rollups(user_ids)
+        rebuild_streaks(user_ids)
+
+
+def recompute_goals(user_ids=None, since=None, batch_size: int = 10000) -> int:
+    """
+    Reaplica a fórmula de meta às metas de History a partir de 'since' (inclusivo, None para todos os dias)
+
+    Cada faixa de ids é atualizada por um único UPDATE com subconsulta em User, em uma transação
+    curta, e só toca as linhas cuja meta mudou. Ao final recalcula consolidados e sequências dos
+    usuários afetados. Retorna a quantidade de dias alterados
+    """
+
+    goal = Subquery(
+        User.objects.filter(pk=OuterRef('user_id'))
+        .annotate(new_goal=get_goal_formula().expression(F('weight_grams')))
+        .values('new_goal')[:1],
+        output_field=models.IntegerField()
+    )
+
+    queryset = History.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    if since is not None:
+        queryset = queryset.filter(date__gte=since)
+
+    bounds = queryset.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return 0
+
+    updated, users = 0, set()
+    stale = queryset.exclude(goal=goal)
+    batch_size = max(batch_size, 1)
+    for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+        with transaction.atomic():
+            batch = stale.filter(pk__gte=start, pk__lt=start + batch_size)
+            days = list(batch.values_list('user_id', 'date'))
+            if not days:
+                continue
+
+            updated += batch.update(goal=goal, progress=progress_of(F('amount_taken'), goal))
+            users.update(user_id for user_id, _ in days)
+            invalidate_resume(*days)
+
+    # A meta dos consolidados e os dias com meta batida dependem das metas diárias
+    users = sorted(users)
+    for start in range(0, len(users), BATCH_SIZE):
+        rebuild_stats(users[start:start + BATCH_SIZE])
+
+    return updated
+
+
+def intake_series(user: User, since, until, minutes: int = 60) -> list:
+    """
+    Total e quantidade de consumos por faixa de 'minutes' (divisor de 60) entre os dias 'since' e 'until'
+
+    As faixas seguem o fuso do usuário e os consumos em Intake são agrupados no banco (TruncHour
+    e o minuto), sem carregá-los. Os dias já compactados por archive_intakes são somados a partir
+    de IntakeArchive, uma linha por dia. Ficam de fora os consumos sem horário, registrados antes
+    de Intake.created_at existir
+    """
+
+    tzinfo = ZoneInfo(user.timezone)
+    buckets = {'hour': TruncHour('created_at', tzinfo=tzinfo)}
+    if minutes < 60:
+        buckets['slot'] = Floor(ExpressionWrapper(
+            ExtractMinute('created_at', tzinfo=tzinfo) / Value(float(minutes)),
+            output_field=models.FloatField()
+        ))
+
+    rows = (
+        Intake.objects
+        .filter(history_id__user_id=user, history_id__date__range=(since, until), created_at__isnull=False)
+        .annotate(**buckets)
+        .order_by()
+        .values(*buckets)
+        .annotate(total=Sum('quantity'), count=Count('pk'))
+        .order_by(*buckets)
+    )
+
+    series = {}
+    for row in rows:
+        start = row['hour'] + timedelta(minutes=minutes * int(row.get('slot', 0)))
+        series[start] = {"start": start, "total": row['total'], "count": row['count']}
+
+    archives = IntakeArchive.objects.filter(history_id__user_id=user, history_id__date__range=(since, until))
+    for data in archives.values_list('data', flat=True):
+        for _, quantity, created_at in IntakeArchive.decode(data):
+            if created_at is None:
+                continue
+
+            local = created_at.astimezone(tzinfo)
+            start = local.replace(minute=local.minute - local.minute % minutes, second=0, microsecond=0)
+            bucket = series.setdefault(start, {"start": start, "total": 0, "count": 0})
+            bucket["total"] += quantity
+            bucket["count"] += 1
+
+    return sorted(series.values(), key=lambda bucket: bucket["start"])
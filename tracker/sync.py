@@ -0,0 +1,141 @@
+from collections import defaultdict
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from tracker.cache import invalidate_resume
+from tracker.errors import Conflict
+from tracker.events import publish_day
+from tracker.models import User, History, Intake, progress_of
+from tracker.serializers import SyncIntakeSerializer
+from tracker.stats import rebuild_stats, record_intake
+
+
+def ingest_intakes(items: list) -> dict:
+    """
+    Registra em lote consumos gravados offline, de vários usuários e dias
+
+    Todos os itens são validados antes de qualquer escrita. Itens inválidos são
+    reportados pelo índice e os demais são gravados. Chaves já sincronizadas pelo mesmo
+    usuário são ignoradas, tornando o reenvio do mesmo lote seguro
+    """
+
+    errors = []
+    valid = []
+    for index, item in enumerate(items):
+        serializer = SyncIntakeSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({"index": index, "errors": serializer.errors})
+
+    users = User.objects.in_bulk({data["user"] for _, data in valid})
+    keys = {Intake.scoped_key(data["user"], data["key"]) for _, data in valid}
+    synced_keys = set(Intake.objects.filter(client_key__in=keys).values_list("client_key", flat=True))
+
+    pending = []
+    duplicated = 0
+    for index, data in valid:
+        if data["user"] not in users:
+            errors.append({"index": index, "errors": {"user": ["Usuário não encontrado"]}})
+        elif Intake.scoped_key(data["user"], data["key"]) in synced_keys:
+            duplicated += 1
+        else:
+            # Também descarta chaves repetidas dentro do próprio lote
+            synced_keys.add(Intake.scoped_key(data["user"], data["key"]))
+            pending.append(data)
+
+    if pending:
+        try:
+            with transaction.atomic():
+                write_intakes(pending, users)
+        except IntegrityError:
+            # Outra sincronização gravou as mesmas chaves ao mesmo tempo
+            raise Conflict()
+
+    return {
+        "created": len(pending),
+        "duplicated": duplicated,
+        "errors": sorted(errors, key=lambda error: error["index"]),
+    }
+
+
+def write_intakes(pending: list, users: dict, incremental: bool = False):
+    """
+    Cria os dias que faltam, insere os consumos e incrementa os totais, sem consultas por item
+
+    Com incremental=True os consolidados e sequências são atualizados por record_intake, uma vez
+    por dia, em vez de recalculados. Adequado quando os dias são recentes, como no write-behind
+    """
+
+    days = {(data["user"], data["date"]) for data in pending}
+    user_ids = {user_id for user_id, _ in days}
+    dates = {date for _, date in days}
+
+    def fetch_history():
+        return {
+            (point.user_id_id, point.date): point
+            for point in History.objects.filter(user_id__in=user_ids, date__in=dates).only(
+                "id", "user_id", "date", "goal", "amount_taken", "intake_count"
+            )
+        }
+
+    history = fetch_history()
+    missing = days - history.keys()
+    if missing:
+        History.objects.bulk_create(
+            [
+                History(user_id=users[user_id], goal=users[user_id].daily_goal, date=date)
+                for user_id, date in missing
+            ],
+            ignore_conflicts=True
+        )
+        history = fetch_history()
+
+    now = timezone.now()
+    Intake.objects.bulk_create(
+        [
+            Intake(
+                history_id=history[(data["user"], data["date"])],
+                quantity=data["quantity"],
+                client_key=Intake.scoped_key(data["user"], data["key"]),
+                created_at=data.get("created_at", now)
+            )
+            for data in pending
+        ]
+    )
+
+    # bulk_create não passa por Intake.save, então os totais são incrementados aqui
+    amounts = defaultdict(int)
+    counts = defaultdict(int)
+    for data in pending:
+        point = history[(data["user"], data["date"])]
+        amounts[point.pk] += data["quantity"]
+        counts[point.pk] += 1
+
+    amount_taken = F("amount_taken") + Case(
+        *[When(pk=pk, then=Value(amount)) for pk, amount in amounts.items()],
+        output_field=models.IntegerField()
+    )
+    History.objects.filter(pk__in=amounts.keys()).update(
+        amount_taken=amount_taken,
+        intake_count=F("intake_count") + Case(
+            *[When(pk=pk, then=Value(count)) for pk, count in counts.items()],
+            output_field=models.IntegerField()
+        ),
+        progress=progress_of(amount_taken)
+    )
+
+    invalidate_resume(*days)
+    for user_id, date in days:
+        publish_day(user_id, date)
+
+    if incremental:
+        # 'history' ainda tem os totais anteriores ao lote, como record_intake espera
+        for point in history.values():
+            if point.pk in amounts:
+                record_intake(point, amounts[point.pk])
+        return
+
+    # Dias de datas arbitrárias podem alterar sequências, então recalcula só os usuários afetados
+    rebuild_stats(user_ids)
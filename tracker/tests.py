@@ -1,12 +1,43 @@
+import asyncio
 import json
+import threading
+import zlib
+from datetime import datetime, date, timezone as dt_timezone
+from unittest import mock
+from io import StringIO
 from _decimal import Decimal
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import IntegerField, Value
+from django.test import AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.reverse import reverse
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APITestCase, APIClient, APITransactionTestCase
 
-from tracker.models import User, History, Intake
+from tracker import async_views
+from tracker.admin import IntakeAdmin
+from tracker.bench import percentile, summarize_latencies
+from tracker.buffer import buffer
+from tracker.cache import resume_version, set_resume, timezone_cache_key
+from tracker.events import Broker, get_broker, publish_day, user_channel
+from tracker.export import aiterate
+from tracker.goals import GoalFormula, WeightFormula
+from tracker.metrics import registry
+from tracker.purge import purge_users
+from tracker.renderers import FastJSONRenderer
+from tracker.representations import USER_VALUES, history_data, history_queryset, user_data
+from tracker.routers import ReplicaRouter, read_from_replica, replica_reads
+from tracker.models import User, History, Intake, IntakeArchive, Rollup, Streak
+from tracker.serializers import HistorySerializer, UserSerializer
+from tracker.stats import period_starts, record_intake
 
 client = APIClient()
 
@@ -52,8 +83,10 @@ class CreateNewUserTest(APITestCase):
 
 class UserDrinkTest(APITestCase):
     def setUp(self) -> None:
+        cache.clear()
+
         self.user = User.objects.create(
-            name="Antônio João", weight=75
+            name="Antônio João", weight_grams=75000
         )
 
         self.valid_payload = {
@@ -72,6 +105,25 @@ class UserDrinkTest(APITestCase):
         )
 
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['quantity'], format_decimal(300))
+        self.assertEqual(response.data['resume']['amount_taken'], format_decimal(300))
+        self.assertEqual(response.data['resume']['reached_goal'], False)
+
+    def test_zero_goal_drink(self):
+        # Pesos abaixo de ~14g também arredondam a meta para zero
+        User.objects.filter(pk=self.user.pk).update(weight_grams=0)
+        response = client.post(
+            reverse('user-drink', kwargs={'pk': self.user.pk}),
+            json.dumps(self.valid_payload),
+            content_type='application/json'
+        )
+        resume = client.get(reverse('user-resume', kwargs={'pk': self.user.pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['resume']['percent_reached'], "0.00")
+        self.assertEqual(response.data['resume']['reached_goal'], True)
+        self.assertEqual(resume.data['percent_reached'], "0.00")
+        self.assertEqual(resume.data['reached_goal'], True)
 
     def test_invalid_user_drink(self):
         response = client.post(
@@ -85,8 +137,10 @@ class UserDrinkTest(APITestCase):
 
 class UserResumeTest(APITestCase):
     def setUp(self) -> None:
+        cache.clear()
+
         self.user = User.objects.create(
-            name="Antônio João", weight=75
+            name="Antônio João", weight_grams=75000
         )
 
         self.history_point = History.objects.create(
@@ -123,6 +177,37 @@ class UserResumeTest(APITestCase):
         )
         self.assertEqual(body['reached_goal'], False)
 
+    def test_percent_format(self):
+        resume = client.get(reverse('user-resume', kwargs={'pk': self.user.pk}))
+        history = client.get(reverse('user-history', kwargs={'pk': self.user.pk}))
+        export = client.get(reverse('user-export', kwargs={'pk': self.user.pk}))
+
+        # 500ML de 2625ML
+        self.assertEqual(resume.data['percent_reached'], "19.05")
+        self.assertEqual(history.data['results'][0]['percent_reached'], "19.05")
+        self.assertEqual(json.loads(b"".join(export.streaming_content))['percent_reached'], "19.05")
+        self.assertEqual(str(History.objects.with_summary().get(pk=self.history_point.pk).percent_amount), "19.05")
+
+    def test_percent_half_rounding(self):
+        # Meta de 800ML: 1ML é 0.125%, que arredonda para o par (0.12) em todos os endpoints
+        user = User.objects.create(name="Maria", weight_grams=22857)
+        drink = client.post(
+            reverse('user-drink', kwargs={'pk': user.pk}),
+            json.dumps({"quantity": 1}),
+            content_type='application/json'
+        )
+        resume = client.get(reverse('user-resume', kwargs={'pk': user.pk}))
+        history = client.get(reverse('user-history', kwargs={'pk': user.pk}))
+        export = client.get(reverse('user-export', kwargs={'pk': user.pk}))
+        batch = client.get(reverse('user-batch-resume'), {"ids": user.pk})
+
+        self.assertEqual(user.daily_goal, 800)
+        self.assertEqual(drink.data['resume']['percent_reached'], "0.12")
+        self.assertEqual(resume.data['percent_reached'], "0.12")
+        self.assertEqual(history.data['results'][0]['percent_reached'], "0.12")
+        self.assertEqual(json.loads(b"".join(export.streaming_content))['percent_reached'], "0.12")
+        self.assertEqual(batch.data['results'][0]['days'][0]['percent_reached'], "0.12")
+
     def test_invalid_resume_date(self):
         response = client.get(
             f"{reverse('user-resume', kwargs={'pk': self.user.pk})}?date=invalid_date",
@@ -137,5 +222,1384 @@ class UserResumeTest(APITestCase):
         body = response.data
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(body), 1)
-        self.assertEqual(body[0]['date'], timezone.now().strftime('%Y-%m-%d'))
+        self.assertEqual(len(body['results']), 1)
+        self.assertEqual(body['results'][0]['date'], timezone.now().strftime('%Y-%m-%d'))
+
+
+class HistoryTotalsTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(
+            name="Antônio João", weight_grams=75000
+        )
+
+        self.history_point = History.objects.create(
+            user_id=self.user, goal=self.user.daily_goal
+        )
+
+    def test_drink_updates_totals(self):
+        for quantity in (300, 200):
+            client.post(
+                reverse('user-drink', kwargs={'pk': self.user.pk}),
+                json.dumps({"quantity": quantity}),
+                content_type='application/json'
+            )
+
+        self.history_point.refresh_from_db()
+        self.assertEqual(self.history_point.amount_taken, Decimal(500))
+        self.assertEqual(self.history_point.intake_count, 2)
+
+    def test_summary_does_not_aggregate_intakes(self):
+        Intake.objects.create(history_id=self.history_point, quantity=500)
+        history = History.objects.get(pk=self.history_point.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(history.amount_taken, Decimal(500))
+            self.assertEqual(history.amount_left, self.user.daily_goal - 500)
+            self.assertFalse(history.reached_goal)
+
+    def test_edit_intake_updates_totals(self):
+        intake = Intake.objects.create(history_id=self.history_point, quantity=100)
+        intake.quantity = 500
+        intake.save()
+
+        self.history_point.refresh_from_db()
+        self.assertEqual(self.history_point.amount_taken, 500)
+        self.assertEqual(self.history_point.intake_count, 1)
+
+        other = History.objects.create(
+            user_id=self.user, goal=self.user.daily_goal, date=self.history_point.date - timezone.timedelta(days=1)
+        )
+        intake.history_id = other
+        intake.save()
+
+        self.history_point.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.history_point.amount_taken, self.history_point.intake_count), (0, 0))
+        self.assertEqual((other.amount_taken, other.intake_count), (500, 1))
+
+    def test_admin_bulk_delete_updates_totals(self):
+        for quantity in (100, 250, 300):
+            client.post(
+                reverse('user-drink', kwargs={'pk': self.user.pk}),
+                json.dumps({"quantity": quantity}),
+                content_type='application/json'
+            )
+
+        IntakeAdmin(Intake, admin.site).delete_queryset(None, Intake.objects.filter(quantity__lt=300))
+
+        self.history_point.refresh_from_db()
+        self.assertEqual(self.history_point.amount_taken, 300)
+        self.assertEqual(self.history_point.intake_count, 1)
+        self.assertEqual(Rollup.objects.get(user_id=self.user, period=Rollup.WEEK).total, 300)
+
+    def test_reconcile_totals(self):
+        Intake.objects.bulk_create([
+            Intake(history_id=self.history_point, quantity=250),
+            Intake(history_id=self.history_point, quantity=250),
+        ])
+
+        call_command('reconcile_totals', stdout=StringIO())
+
+        self.history_point.refresh_from_db()
+        self.assertEqual(self.history_point.amount_taken, Decimal(500))
+        self.assertEqual(self.history_point.intake_count, 2)
+
+
+class HistoryListingQueriesTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(
+            name="Antônio João", weight_grams=75000
+        )
+
+    def create_days(self, days: int) -> None:
+        """
+        Cria dias anteriores a hoje no histórico do usuário, cada um com dois consumos
+        """
+
+        today = timezone.now().date()
+        existing = History.objects.filter(user_id=self.user).count()
+        for offset in range(existing + 1, existing + days + 1):
+            history = History.objects.create(user_id=self.user, goal=self.user.daily_goal)
+            History.objects.filter(pk=history.pk).update(date=today - timezone.timedelta(days=offset))
+            Intake.objects.create(history_id=history, quantity=300)
+            Intake.objects.create(history_id=history, quantity=2400)
+
+    def test_constant_query_count(self):
+        url = reverse('user-history', kwargs={'pk': self.user.pk})
+
+        self.create_days(1)
+        with self.assertNumQueries(3):
+            client.get(url)
+
+        self.create_days(20)
+        with self.assertNumQueries(3):
+            response = client.get(f"{url}?page_size=21")
+
+        self.assertEqual(len(response.data['results']), 21)
+
+    def test_annotated_summary_matches_properties(self):
+        self.create_days(1)
+        history = History.objects.get(user_id=self.user)
+        annotated = History.objects.with_summary().get(user_id=self.user)
+
+        self.assertEqual(annotated.amount_left, history.amount_left)
+        self.assertEqual(annotated.percent_amount, history.percent_amount)
+        self.assertEqual(annotated.reached_goal, history.reached_goal)
+        self.assertTrue(annotated.reached_goal)
+
+
+class HistoryPaginationTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(
+            name="Antônio João", weight_grams=75000
+        )
+
+        self.today = timezone.now().date()
+        for offset in range(1, 6):
+            history = History.objects.create(user_id=self.user, goal=self.user.daily_goal)
+            History.objects.filter(pk=history.pk).update(date=self.today - timezone.timedelta(days=offset))
+
+        self.url = reverse('user-history', kwargs={'pk': self.user.pk})
+
+    def test_cursor_pages(self):
+        response = client.get(f"{self.url}?page_size=2")
+        first_page = response.data
+
+        self.assertEqual(len(first_page['results']), 2)
+        self.assertIsNotNone(first_page['next'])
+
+        response = client.get(first_page['next'])
+        second_page = response.data
+
+        self.assertEqual(len(second_page['results']), 2)
+        self.assertLess(first_page['results'][-1]['date'], second_page['results'][0]['date'])
+
+    def test_since_until(self):
+        since = self.today - timezone.timedelta(days=4)
+        until = self.today - timezone.timedelta(days=2)
+
+        response = client.get(f"{self.url}?since={since}&until={until}")
+        dates = [row['date'] for row in response.data['results']]
+
+        self.assertEqual(dates, [str(since), str(since + timezone.timedelta(days=1)), str(until)])
+
+    def test_invalid_since(self):
+        response = client.get(f"{self.url}?since=invalid_date")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SeedTrackerTest(APITestCase):
+    def test_seed_consistent_totals(self):
+        call_command('seed_tracker', users=2, days=3, intakes=4, stdout=StringIO())
+
+        self.assertEqual(History.objects.count(), 6)
+        self.assertEqual(Intake.objects.count(), 24)
+
+        history = History.objects.order_by('date').first()
+        self.assertEqual(history.intake_count, 4)
+        self.assertEqual(history.amount_taken, sum(intake.quantity for intake in history.intake.all()))
+
+
+class ConcurrentDrinkTest(APITransactionTestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(
+            name="Antônio João", weight_grams=75000
+        )
+
+    def test_concurrent_first_drinks(self):
+        threads_count = 8
+        barrier = threading.Barrier(threads_count)
+        statuses = []
+
+        def drink():
+            try:
+                barrier.wait()
+                response = APIClient().post(
+                    reverse('user-drink', kwargs={'pk': self.user.pk}),
+                    json.dumps({"quantity": 100}),
+                    content_type='application/json'
+                )
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=drink) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, [status.HTTP_201_CREATED] * threads_count)
+
+        history = History.objects.get(user_id=self.user)
+        self.assertEqual(history.intake_count, threads_count)
+        self.assertEqual(history.amount_taken, Decimal(100 * threads_count))
+
+    def test_repeat_drink_query_count(self):
+        url = reverse('user-drink', kwargs={'pk': self.user.pk})
+        client.post(url, json.dumps({"quantity": 100}), content_type='application/json')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(url, json.dumps({"quantity": 100}), content_type='application/json')
+
+        # Usuário, dia, consumo, totais do dia e consolidados da semana e do mês, sem savepoints.
+        # BEGIN e COMMIT só aparecem na captura em alguns bancos
+        statements = [query['sql'] for query in queries if not query['sql'].startswith(('BEGIN', 'COMMIT'))]
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(statements), 6, statements)
+
+    def test_sqlite_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Pragmas aplicados apenas no SQLite")
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute("PRAGMA synchronous")
+            # NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+@override_settings(TRACKER_WRITE_BEHIND=True, TRACKER_WRITE_BEHIND_INTERVAL=60)
+class WriteBehindTest(APITransactionTestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(
+            name="Antônio João", weight_grams=75000
+        )
+
+    def tearDown(self) -> None:
+        buffer.stop()
+
+    def drink(self, quantity):
+        return client.post(
+            reverse('user-drink', kwargs={'pk': self.user.pk}),
+            json.dumps({"quantity": quantity}),
+            content_type='application/json'
+        )
+
+    def test_drink_is_buffered(self):
+        response = self.drink(300)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['quantity'], format_decimal(300))
+        self.assertIsNone(response.data['resume']['id'])
+        self.assertEqual(response.data['resume']['amount_taken'], format_decimal(300))
+        self.assertFalse(Intake.objects.exists())
+
+        response = self.drink(200)
+        self.assertEqual(response.data['resume']['amount_taken'], format_decimal(500))
+        self.assertEqual(len(buffer), 2)
+
+    def test_resume_reads_own_writes(self):
+        key = self.drink(300).data['key']
+
+        response = client.get(reverse('user-resume', kwargs={'pk': self.user.pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['amount_taken'], format_decimal(300))
+        self.assertEqual(Intake.objects.get().client_key, Intake.scoped_key(self.user.pk, key))
+        self.assertEqual(len(buffer), 0)
+
+    def test_stop_flushes_pending(self):
+        for quantity in (1000, 1000, 1000):
+            self.drink(quantity)
+
+        buffer.stop()
+
+        history = History.objects.get(user_id=self.user)
+        self.assertEqual(history.intake_count, 3)
+        self.assertEqual(history.amount_taken, Decimal(3000))
+        self.assertTrue(history.reached_goal)
+
+        week = Rollup.objects.get(user_id=self.user, period=Rollup.WEEK)
+        self.assertEqual(week.total, Decimal(3000))
+        self.assertEqual((week.days, week.days_reached), (1, 1))
+        self.assertEqual(Streak.objects.get(user_id=self.user).current, 1)
+
+    @override_settings(TRACKER_WRITE_BEHIND_MAX_PENDING=1)
+    def test_full_buffer_writes_immediately(self):
+        self.assertEqual(self.drink(100).status_code, status.HTTP_202_ACCEPTED)
+
+        response = self.drink(100)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Intake.objects.count(), 1)
+
+
+class ReplicaRouterTest(APITestCase):
+    def test_reads_inside_block(self):
+        router = ReplicaRouter()
+
+        self.assertIsNone(router.db_for_read(History))
+        with read_from_replica():
+            self.assertEqual(router.db_for_read(History), 'replica')
+            self.assertIsNone(router.db_for_write(History))
+        self.assertIsNone(router.db_for_read(History))
+
+    @override_settings(DATABASE_ROUTERS=['tracker.routers.ReplicaRouter'])
+    def test_resume_cache_filled_from_default(self):
+        cache.clear()
+        user = User.objects.create(name="Antônio João", weight_grams=75000)
+        History.objects.create(user_id=user, goal=user.daily_goal)
+
+        # Registra, a cada leitura, se ela seria enviada à réplica
+        routed = []
+        with mock.patch.object(
+            ReplicaRouter, 'db_for_read', side_effect=lambda model, **hints: routed.append(replica_reads.get())
+        ):
+            response = client.get(reverse('user-resume', kwargs={'pk': user.pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(routed)
+        self.assertNotIn(True, routed)
+
+    def test_no_migrations_on_replica(self):
+        router = ReplicaRouter()
+
+        self.assertFalse(router.allow_migrate('replica', 'tracker'))
+        self.assertIsNone(router.allow_migrate('default', 'tracker'))
+
+
+class SyncIntakesTest(APITestCase):
+    def setUp(self) -> None:
+        self.users = [
+            User.objects.create(name="Antônio João", weight_grams=75000),
+            User.objects.create(name="Maria José", weight_grams=60000),
+        ]
+
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timezone.timedelta(days=1)
+
+        # O dia de hoje do primeiro usuário já existe
+        self.history_point = History.objects.create(user_id=self.users[0], goal=self.users[0].daily_goal)
+
+        self.payload = [
+            {"key": "a-1", "user": self.users[0].pk, "date": str(self.today), "quantity": 300},
+            {"key": "a-2", "user": self.users[0].pk, "date": str(self.yesterday), "quantity": 200},
+            {"key": "b-1", "user": self.users[1].pk, "date": str(self.today), "quantity": 250},
+            {"key": "b-2", "user": self.users[1].pk, "date": str(self.today), "quantity": 250},
+        ]
+
+    def sync(self, payload):
+        return client.post(reverse('user-sync'), json.dumps(payload), content_type='application/json')
+
+    def test_sync_keeps_client_timestamp(self):
+        self.payload[0]["created_at"] = "2026-03-10T11:05:00Z"
+        self.sync(self.payload)
+
+        self.assertEqual(
+            Intake.objects.get(client_key=Intake.scoped_key(self.users[0].pk, "a-1")).created_at,
+            datetime(2026, 3, 10, 11, 5, tzinfo=dt_timezone.utc)
+        )
+        self.assertIsNotNone(Intake.objects.get(client_key=Intake.scoped_key(self.users[0].pk, "a-2")).created_at)
+
+    def test_sync(self):
+        response = self.sync(self.payload)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"created": 4, "duplicated": 0, "errors": []})
+
+        self.history_point.refresh_from_db()
+        self.assertEqual(self.history_point.amount_taken, Decimal(300))
+
+        history = History.objects.get(user_id=self.users[1], date=self.today)
+        self.assertEqual(history.amount_taken, Decimal(500))
+        self.assertEqual(history.intake_count, 2)
+        self.assertTrue(History.objects.filter(user_id=self.users[0], date=self.yesterday).exists())
+
+    def test_sync_is_idempotent(self):
+        self.sync(self.payload)
+        response = self.sync(self.payload)
+
+        self.assertEqual(response.data, {"created": 0, "duplicated": 4, "errors": []})
+        self.assertEqual(Intake.objects.count(), 4)
+
+        history = History.objects.get(user_id=self.users[1], date=self.today)
+        self.assertEqual(history.amount_taken, Decimal(500))
+
+    def test_same_key_for_different_users(self):
+        # Aplicativos que numeram os consumos localmente geram as mesmas chaves
+        payload = [
+            {"key": "1", "user": user.pk, "date": str(self.today), "quantity": 300} for user in self.users
+        ]
+
+        response = self.sync(payload)
+
+        self.assertEqual(response.data, {"created": 2, "duplicated": 0, "errors": []})
+        self.assertEqual(self.sync(payload).data["duplicated"], 2)
+        for user in self.users:
+            self.assertEqual(History.objects.get(user_id=user, date=self.today).amount_taken, 300)
+
+    def test_sync_reports_invalid_items(self):
+        payload = [
+            *self.payload,
+            {"key": "c-1", "user": 999999, "date": str(self.today), "quantity": 100},
+            {"key": "c-2", "user": self.users[1].pk, "date": "invalid_date", "quantity": 100},
+        ]
+
+        response = self.sync(payload)
+
+        self.assertEqual(response.data['created'], 4)
+        self.assertEqual([error['index'] for error in response.data['errors']], [4, 5])
+
+    def test_sync_query_count(self):
+        payload = [
+            {"key": f"k-{index}", "user": self.users[index % 2].pk, "date": str(self.today), "quantity": 100}
+            for index in range(200)
+        ]
+
+        # usuários, chaves, dias, criação dos dias, dias criados, consumos, totais, estatísticas e savepoints
+        with self.assertNumQueries(19):
+            self.sync(payload)
+
+    def test_sync_expects_list(self):
+        response = self.sync({"key": "a-1"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class HistoryExportTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(
+            name="Antônio João", weight_grams=75000
+        )
+
+        today = timezone.localdate()
+        for offset in range(3):
+            history = History.objects.create(
+                user_id=self.user, goal=self.user.daily_goal, date=today - timezone.timedelta(days=offset)
+            )
+            Intake.objects.create(history_id=history, quantity=300)
+
+        self.url = reverse('user-export', kwargs={'pk': self.user.pk})
+
+    def read(self, response) -> str:
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        response = client.get(f"{self.url}?intakes=1")
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(rows), 3)
+        self.assertLess(rows[0]['date'], rows[-1]['date'])
+        self.assertEqual(rows[0]['amount_taken'], format_decimal(300))
+        self.assertEqual(len(rows[0]['intakes']), 1)
+
+    def test_export_csv(self):
+        response = client.get(f"{self.url}?output=csv")
+        lines = self.read(response).splitlines()
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'date'])
+        self.assertNotIn('intakes', lines[0])
+        self.assertEqual(len(lines), 4)
+
+    def test_invalid_output(self):
+        response = client.get(f"{self.url}?output=xml")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_async_export(self):
+        expected = await sync_to_async(lambda: self.read(client.get(f"{self.url}?intakes=1")))()
+
+        request = AsyncRequestFactory().get('/', {"intakes": "1"})
+        response = await async_views.export(request, pk=self.user.pk)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        self.assertTrue(response.is_async)
+        self.assertEqual(content, expected)
+
+    async def test_async_export_reads_in_chunks(self):
+        pulled = []
+
+        def lines():
+            for line in range(5):
+                pulled.append(line)
+                yield str(line)
+
+        stream = aiterate(lines(), size=2)
+
+        # O primeiro lote é enviado antes de o restante ser lido
+        self.assertEqual(await anext(stream), "0")
+        self.assertEqual(pulled, [0, 1])
+        self.assertEqual([line async for line in stream], ["1", "2", "3", "4"])
+
+
+class ResumeCacheTest(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+        self.user = User.objects.create(
+            name="Antônio João", weight_grams=75000
+        )
+
+        self.history_point = History.objects.create(
+            user_id=self.user, goal=self.user.daily_goal
+        )
+
+        self.url = reverse('user-resume', kwargs={'pk': self.user.pk})
+
+    def drink(self, quantity):
+        return client.post(
+            reverse('user-drink', kwargs={'pk': self.user.pk}),
+            json.dumps({"quantity": quantity}),
+            content_type='application/json'
+        )
+
+    def test_cached_resume_skips_database(self):
+        first = client.get(self.url)
+
+        with self.assertNumQueries(0):
+            second = client.get(self.url)
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_not_modified(self):
+        etag = client.get(self.url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_drink_invalidates_resume(self):
+        etag = client.get(self.url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.drink(300)
+
+        response = client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['amount_taken'], format_decimal(300))
+
+    def test_read_before_drink_is_not_cached(self):
+        # Um resume que consultou o banco antes de um drink terminar só grava no cache depois dele
+        version = resume_version(self.user.pk, self.history_point.date)
+        stale = history_data(history_queryset(History.objects.filter(pk=self.history_point.pk)))[0]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.drink(300)
+
+        set_resume(self.user.pk, self.history_point.date, stale, version)
+        response = client.get(self.url)
+
+        self.assertEqual(response.data['amount_taken'], format_decimal(300))
+
+
+class AsyncViewsTest(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+        self.factory = AsyncRequestFactory()
+        self.user = User.objects.create(
+            name="Antônio João", weight_grams=75000
+        )
+
+    async def test_drink_and_resume(self):
+        request = self.factory.post('/', json.dumps({"quantity": 300}), content_type='application/json')
+        response = await async_views.drink(request, pk=self.user.pk)
+        body = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(body['resume']['amount_taken'], format_decimal(300))
+
+        response = await async_views.resume(self.factory.get('/'), pk=self.user.pk)
+        body = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(body['intakes']), 1)
+        self.assertEqual(body['amount_taken'], format_decimal(300))
+
+    async def test_drink_is_atomic(self):
+        request = self.factory.post('/', json.dumps({"quantity": 300}), content_type='application/json')
+
+        with mock.patch('tracker.async_views.record_intake', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                await async_views.drink(request, pk=self.user.pk)
+
+        # Sem consumo gravado, o cliente pode repetir o drink sem duplicá-lo
+        self.assertFalse(await Intake.objects.filter(history_id__user_id=self.user).aexists())
+
+    async def test_invalid_drink(self):
+        request = self.factory.post('/', json.dumps({"quantity": None}), content_type='application/json')
+        response = await async_views.drink(request, pk=self.user.pk)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_history(self):
+        await History.objects.acreate(user_id=self.user, goal=self.user.daily_goal)
+
+        response = await async_views.history(self.factory.get('/'), pk=self.user.pk)
+        body = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(body['results']), 1)
+
+    async def test_unknown_user(self):
+        response = await async_views.history(self.factory.get('/'), pk=999999)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_method_not_allowed(self):
+        response = await async_views.resume(self.factory.post('/'), pk=self.user.pk)
+
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class ConcurrentAsyncDrinkTest(APITransactionTestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+        # Meta de 350ML
+        self.user = User.objects.create(
+            name="Antônio João", weight_grams=10000
+        )
+
+    async def test_concurrent_first_drinks(self):
+        factory = AsyncRequestFactory()
+
+        async def drink():
+            request = factory.post('/', json.dumps({"quantity": 200}), content_type='application/json')
+            return await async_views.drink(request, pk=self.user.pk)
+
+        responses = await asyncio.gather(*(drink() for _ in range(4)))
+
+        self.assertEqual([response.status_code for response in responses], [status.HTTP_201_CREATED] * 4)
+        self.assertEqual(
+            sorted(json.loads(response.content)['resume']['amount_taken'] for response in responses),
+            [format_decimal(200 * count) for count in range(1, 5)]
+        )
+
+        week = await Rollup.objects.aget(user_id=self.user, period=Rollup.WEEK)
+        streak = await Streak.objects.aget(user_id=self.user)
+        self.assertEqual((week.total, week.days, week.days_reached), (800, 1, 1))
+        self.assertEqual(streak.current, 1)
+
+
+class RecordingBroker(Broker):
+    """
+    Broker que apenas guarda as mensagens publicadas, usado no lugar de um broker externo
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, channel: str, message):
+        self.messages.append((channel, message))
+
+
+class EventStreamTest(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+        self.factory = AsyncRequestFactory()
+        self.user = User.objects.create(
+            name="Antônio João", weight_grams=75000
+        )
+
+    @override_settings(TRACKER_EVENT_BROKER='tracker.tests.RecordingBroker')
+    def test_drink_publishes_summary(self):
+        broker = get_broker()
+        broker.messages.clear()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(
+                reverse('user-drink', kwargs={'pk': self.user.pk}),
+                json.dumps({"quantity": 300}),
+                content_type='application/json'
+            )
+
+        resume = client.get(reverse('user-resume', kwargs={'pk': self.user.pk}))
+        self.assertEqual(broker.messages, [(user_channel(self.user.pk), resume.data)])
+
+    def test_no_subscribers_no_queries(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks, self.assertNumQueries(0):
+            publish_day(self.user.pk, self.user.local_date())
+
+        self.assertEqual(callbacks, [])
+
+    @override_settings(TRACKER_EVENTS_MAX_AGE=0.2, TRACKER_EVENTS_KEEPALIVE=0.05)
+    async def test_stream(self):
+        await History.objects.acreate(user_id=self.user, goal=self.user.daily_goal)
+
+        response = await async_views.events(self.factory.get('/'), pk=self.user.pk)
+        get_broker().publish(user_channel(self.user.pk), {"amount_taken": format_decimal(300)})
+
+        chunks = [chunk.decode() async for chunk in response.streaming_content]
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(chunks[0], "retry: 3000\n\n")
+        self.assertTrue(chunks[1].startswith('event: resume\ndata: {"id":'))
+        self.assertEqual(chunks[2], 'event: resume\ndata: {"amount_taken":"300.00"}\n\n')
+        self.assertIn(": keepalive\n\n", chunks[3:])
+        self.assertFalse(get_broker().has_subscribers(user_channel(self.user.pk)))
+
+    async def test_unknown_user(self):
+        response = await async_views.events(self.factory.get('/'), pk=999999)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class UserStatsTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(
+            name="Antônio João", weight_grams=20000
+        )
+
+        self.today = timezone.localdate()
+        self.url = reverse('user-stats', kwargs={'pk': self.user.pk})
+
+    def drink(self, quantity):
+        return client.post(
+            reverse('user-drink', kwargs={'pk': self.user.pk}),
+            json.dumps({"quantity": quantity}),
+            content_type='application/json'
+        )
+
+    def create_reached_day(self, offset: int):
+        history = History.objects.create(
+            user_id=self.user,
+            goal=self.user.daily_goal,
+            date=self.today - timezone.timedelta(days=offset),
+            amount_taken=self.user.daily_goal,
+            intake_count=1
+        )
+        Intake.objects.bulk_create([Intake(history_id=history, quantity=self.user.daily_goal)])
+
+    def test_drink_updates_rollups_and_streak(self):
+        # Meta diária de 700ML
+        self.drink(400)
+        self.drink(400)
+        self.drink(100)
+
+        week = Rollup.objects.get(user_id=self.user, period=Rollup.WEEK)
+        self.assertEqual(week.total, Decimal(900))
+        self.assertEqual(week.days, 1)
+        self.assertEqual(week.days_reached, 1)
+
+        response = client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['current_streak'], 1)
+        self.assertEqual(response.data['rollups'][0]['total'], format_decimal(900))
+        self.assertEqual(response.data['rollups'][0]['average'], format_decimal(900))
+
+    def test_streak_continues_from_yesterday(self):
+        self.create_reached_day(2)
+        self.create_reached_day(1)
+        call_command('rebuild_stats', stdout=StringIO())
+
+        self.drink(700)
+
+        streak = Streak.objects.get(user_id=self.user)
+        self.assertEqual(streak.current, 3)
+        self.assertEqual(streak.longest, 3)
+
+    def test_streak_broken_on_read(self):
+        self.create_reached_day(3)
+        call_command('rebuild_stats', stdout=StringIO())
+
+        response = client.get(self.url)
+
+        self.assertEqual(response.data['current_streak'], 0)
+        self.assertEqual(response.data['longest_streak'], 1)
+
+    def test_rebuild_matches_incremental(self):
+        self.drink(300)
+        self.drink(500)
+        incremental = list(Rollup.objects.order_by('period').values('period', 'start', 'total', 'days', 'days_reached'))
+
+        call_command('rebuild_stats', stdout=StringIO())
+        rebuilt = list(Rollup.objects.order_by('period').values('period', 'start', 'total', 'days', 'days_reached'))
+
+        self.assertEqual(incremental, rebuilt)
+
+    def test_zero_goal(self):
+        User.objects.filter(pk=self.user.pk).update(weight_grams=0)
+        history = History.objects.create(user_id=self.user, goal=0, date=self.today)
+        Intake.objects.create(history_id=history, quantity=200)
+        record_intake(history, 200)
+        incremental = list(Rollup.objects.order_by('period').values_list('total', 'days', 'days_reached', 'progress'))
+
+        call_command('rebuild_stats', stdout=StringIO())
+
+        history.refresh_from_db()
+        self.assertEqual(history.progress, 0)
+        self.assertEqual(incremental, [(200, 1, 1, 0.0), (200, 1, 1, 0.0)])
+        self.assertEqual(
+            list(Rollup.objects.order_by('period').values_list('total', 'days', 'days_reached', 'progress')),
+            incremental
+        )
+        self.assertEqual(Streak.objects.get(user_id=self.user).current, 1)
+
+    def test_invalid_period(self):
+        response = client.get(f"{self.url}?period=year")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LeaderboardTest(APITestCase):
+    def setUp(self) -> None:
+        # Metas diárias de 700ML
+        self.users = [User.objects.create(name=f"Usuário {index}", weight_grams=20000) for index in range(4)]
+        self.url = reverse('user-leaderboard')
+
+        for user, quantity in zip(self.users, (700, 350, 350, 70)):
+            client.post(
+                reverse('user-drink', kwargs={'pk': user.pk}),
+                json.dumps({"quantity": quantity}),
+                content_type='application/json'
+            )
+
+    def test_day_top(self):
+        response = client.get(f"{self.url}?limit=3")
+        top = response.data['top']
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['user'] for row in top], [user.pk for user in self.users[:3]])
+        self.assertEqual([row['rank'] for row in top], [1, 2, 2])
+        self.assertEqual(top[0]['percent'], format_decimal(100))
+
+    def test_user_rank(self):
+        response = client.get(f"{self.url}?period=week&user={self.users[3].pk}")
+
+        self.assertEqual(response.data['user']['rank'], 4)
+        self.assertEqual(response.data['user']['percent'], format_decimal(Decimal(70) * 100 / (700 * 7)))
+
+    def test_leaderboard_query_count(self):
+        # Topo, registro do usuário e contagem dos que estão à frente
+        with self.assertNumQueries(3):
+            client.get(f"{self.url}?user={self.users[1].pk}")
+
+    def test_invalid_period(self):
+        response = client.get(f"{self.url}?period=year")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BenchHelpersTest(APITestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 51)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 99), 0.0)
+
+    def test_summarize_latencies(self):
+        summary = summarize_latencies([1.0, 2.0, 3.0])
+
+        self.assertEqual(summary['mean'], 2.0)
+        self.assertEqual(summary['max'], 3.0)
+
+
+@override_settings(TRACKER_REQUEST_METRICS=True)
+class RequestMetricsTest(APITestCase):
+    def setUp(self) -> None:
+        # O cliente do módulo já carregou os middlewares com as métricas desligadas
+        self.client = APIClient()
+        self.user = User.objects.create(name="Maria", weight_grams=60000)
+        registry.clear()
+
+    def test_server_timing(self):
+        response = self.client.get(reverse('user-detail', kwargs={'pk': self.user.pk}))
+        timing = response['Server-Timing']
+
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="1 queries"', timing)
+        self.assertIn('render;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_prometheus_histograms(self):
+        self.client.get(reverse('user-detail', kwargs={'pk': self.user.pk}))
+        response = self.client.get(reverse('metrics'))
+        body = response.content.decode()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('tracker_requests_total{route="user-detail",status="200"} 1', body)
+        self.assertIn('tracker_request_queries_bucket{route="user-detail",le="1"} 1', body)
+        self.assertIn('tracker_request_duration_seconds_count{route="user-detail"} 1', body)
+
+    @override_settings(TRACKER_REQUEST_METRICS=False)
+    def test_disabled(self):
+        response = APIClient().get(reverse('user-detail', kwargs={'pk': self.user.pk}))
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(APIClient().get(reverse('metrics')).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ArchiveIntakesTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(name="Antônio João", weight_grams=75000)
+        self.old = History.objects.create(
+            user_id=self.user, goal=self.user.daily_goal, date=timezone.localdate() - timezone.timedelta(days=100)
+        )
+        self.intakes = [Intake.objects.create(history_id=self.old, quantity=quantity) for quantity in (300, 450)]
+        self.recent = History.objects.create(user_id=self.user, goal=self.user.daily_goal)
+        Intake.objects.create(history_id=self.recent, quantity=200)
+
+    def archive(self):
+        call_command('archive_intakes', days=90, stdout=StringIO())
+
+    def test_archive_old_days(self):
+        self.archive()
+
+        self.old.refresh_from_db()
+        archive = IntakeArchive.objects.get(history_id=self.old)
+
+        self.assertFalse(Intake.objects.filter(history_id=self.old).exists())
+        self.assertEqual(Intake.objects.filter(history_id=self.recent).count(), 1)
+        self.assertEqual((archive.count, archive.total), (2, Decimal(750)))
+        self.assertEqual((self.old.intake_count, self.old.amount_taken), (2, Decimal(750)))
+
+    def test_history_serves_archived_intakes(self):
+        self.archive()
+
+        with self.assertNumQueries(3):
+            response = client.get(reverse('user-history', kwargs={'pk': self.user.pk}))
+        day = next(day for day in response.data['results'] if day['id'] == self.old.pk)
+
+        self.assertEqual(
+            [(intake['id'], intake['quantity']) for intake in day['intakes']],
+            [(intake.pk, format_decimal(intake.quantity)) for intake in self.intakes]
+        )
+
+    def test_merge_late_intakes(self):
+        self.archive()
+        Intake.objects.create(history_id=self.old, quantity=50)
+        self.archive()
+        call_command('reconcile_totals', stdout=StringIO())
+
+        self.old.refresh_from_db()
+        archive = IntakeArchive.objects.get(history_id=self.old)
+
+        self.assertEqual((archive.count, archive.total), (3, Decimal(800)))
+        self.assertEqual((self.old.intake_count, self.old.amount_taken), (3, Decimal(800)))
+
+
+class IntakeSeriesTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(name="Maria", weight_grams=60000, timezone="America/Sao_Paulo")
+        self.day = date(2026, 3, 10)
+        history = History.objects.create(user_id=self.user, goal=self.user.daily_goal, date=self.day)
+
+        # 08:05, 08:20 e 08:50 no fuso do usuário (UTC-3), além de um consumo sem horário
+        for minute, quantity in ((5, 200), (20, 300), (50, 250)):
+            created_at = datetime(2026, 3, 10, 11, minute, tzinfo=dt_timezone.utc)
+            Intake.objects.create(history_id=history, quantity=quantity, created_at=created_at)
+        Intake.objects.create(history_id=history, quantity=999, created_at=None)
+
+        self.url = reverse('user-series', kwargs={'pk': self.user.pk})
+
+    def test_hourly(self):
+        # Usuário, a agregação e os dias arquivados
+        with self.assertNumQueries(3):
+            response = client.get(f"{self.url}?since={self.day}&until={self.day}")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json()['results'],
+            [{"start": "2026-03-10T08:00:00-03:00", "total": format_decimal(750), "count": 3}]
+        )
+
+    def test_quarter_hours(self):
+        response = client.get(f"{self.url}?since={self.day}&until={self.day}&bucket=15min")
+
+        self.assertEqual(
+            [(row['start'], row['total']) for row in response.json()['results']],
+            [
+                ("2026-03-10T08:00:00-03:00", format_decimal(200)),
+                ("2026-03-10T08:15:00-03:00", format_decimal(300)),
+                ("2026-03-10T08:45:00-03:00", format_decimal(250)),
+            ]
+        )
+
+    def test_archived_days(self):
+        call_command('archive_intakes', days=90, stdout=StringIO())
+        # Consumo tardio em um dia já arquivado, ainda em Intake
+        history = History.objects.get(user_id=self.user, date=self.day)
+        Intake.objects.create(
+            history_id=history, quantity=100, created_at=datetime(2026, 3, 10, 11, 25, tzinfo=dt_timezone.utc)
+        )
+
+        response = client.get(f"{self.url}?since={self.day}&until={self.day}&bucket=15min")
+
+        self.assertEqual(IntakeArchive.objects.get(history_id=history).count, 4)
+        self.assertEqual(
+            [(row['start'], row['total'], row['count']) for row in response.json()['results']],
+            [
+                ("2026-03-10T08:00:00-03:00", format_decimal(200), 1),
+                ("2026-03-10T08:15:00-03:00", format_decimal(400), 2),
+                ("2026-03-10T08:45:00-03:00", format_decimal(250), 1),
+            ]
+        )
+
+    def test_legacy_archive_without_timestamps(self):
+        data = zlib.compress(json.dumps([[1, 300]]).encode())
+
+        self.assertEqual(IntakeArchive.decode(data), [(1, 300, None)])
+
+    def test_drink_records_timestamp(self):
+        client.post(
+            reverse('user-drink', kwargs={'pk': self.user.pk}),
+            json.dumps({"quantity": 100}),
+            content_type='application/json'
+        )
+
+        response = client.get(self.url)
+
+        self.assertEqual(response.json()['until'], str(self.user.local_date()))
+        self.assertEqual(response.json()['results'][-1]['total'], format_decimal(100))
+
+    def test_invalid_params(self):
+        for query in ("bucket=day", "since=2026-03-10&until=2026-03-01", "since=2024-01-01&until=2026-03-01"):
+            self.assertEqual(client.get(f"{self.url}?{query}").status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PurgeUsersTest(APITestCase):
+    def setUp(self) -> None:
+        self.user, self.other = [
+            User.objects.create(name=name, weight_grams=60000) for name in ("Antônio João", "Maria José")
+        ]
+
+        for user in (self.user, self.other):
+            for offset in range(5):
+                history = History.objects.create(
+                    user_id=user, goal=user.daily_goal, date=timezone.localdate() - timezone.timedelta(days=offset)
+                )
+                Intake.objects.create(history_id=history, quantity=2500)
+
+        call_command('rebuild_stats', stdout=StringIO())
+        old = History.objects.filter(user_id=self.user).earliest('date')
+        IntakeArchive.objects.create(history_id=old, data=IntakeArchive.pack([[1, 100, None]]), count=1, total=100)
+
+    def assertPurged(self):
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        for model in (History, Rollup, Streak):
+            self.assertFalse(model.objects.filter(user_id=self.user.pk).exists())
+        self.assertFalse(IntakeArchive.objects.exists())
+        self.assertEqual(Intake.objects.count(), 5)
+        self.assertEqual(History.objects.filter(user_id=self.other).count(), 5)
+
+    def test_destroy(self):
+        response = client.delete(reverse('user-detail', kwargs={'pk': self.user.pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertPurged()
+
+    def test_batches_without_loading_intakes(self):
+        with CaptureQueriesContext(connection) as queries:
+            deleted = purge_users([self.user.pk], batch_size=2)
+
+        self.assertEqual(deleted['tracker.History'], 5)
+        self.assertEqual(deleted['tracker.Intake'], 5)
+        self.assertPurged()
+        self.assertFalse([
+            query for query in queries if query['sql'].startswith('SELECT') and 'FROM "tracker_intake"' in query['sql']
+        ])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('purge_users', self.user.pk, 999999, dry_run=True, stdout=out)
+
+        self.assertIn("1 usuário(s) seriam removidos", out.getvalue())
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
+
+        call_command('purge_users', self.user.pk, stdout=StringIO())
+        self.assertPurged()
+
+
+class UserTimezoneTest(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create(name="Maria", weight_grams=60000, timezone="America/Sao_Paulo")
+        # 22h30 do dia 9 em São Paulo, já dia 10 em UTC
+        self.now = datetime(2024, 1, 10, 1, 30, tzinfo=timezone.utc)
+
+    def test_drink_uses_local_day(self):
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            response = client.post(
+                reverse('user-drink', kwargs={'pk': self.user.pk}),
+                json.dumps({"quantity": 250}),
+                content_type='application/json'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(History.objects.get(user_id=self.user).date, date(2024, 1, 9))
+
+    def test_resume_defaults_to_local_day(self):
+        History.objects.create(user_id=self.user, goal=self.user.daily_goal, date=date(2024, 1, 9))
+
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            response = client.get(reverse('user-resume', kwargs={'pk': self.user.pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['date'], '2024-01-09')
+
+    def test_timezone_change_invalidates_cache(self):
+        url = reverse('user-detail', kwargs={'pk': self.user.pk})
+        History.objects.create(user_id=self.user, goal=self.user.daily_goal, date=date(2024, 1, 10))
+
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            client.get(reverse('user-resume', kwargs={'pk': self.user.pk}))
+            with self.captureOnCommitCallbacks(execute=True):
+                client.patch(url, json.dumps({"timezone": "UTC"}), content_type='application/json')
+            response = client.get(reverse('user-resume', kwargs={'pk': self.user.pk}))
+
+        self.assertEqual(response.data['date'], '2024-01-10')
+
+    def test_timezone_cache_expires(self):
+        # Sem cache compartilhado, a invalidação não chega aos outros workers, então o fuso precisa expirar
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            client.get(reverse('user-resume', kwargs={'pk': self.user.pk}))
+
+        key = timezone_cache_key(self.user.pk)
+        timeouts = [call.args[2] for call in cache_set.call_args_list if call.args[0] == key]
+        self.assertEqual(timeouts, [settings.TRACKER_USER_TIMEZONE_CACHE_TIMEOUT])
+        self.assertIsNotNone(settings.TRACKER_USER_TIMEZONE_CACHE_TIMEOUT)
+
+    def test_invalid_timezone(self):
+        response = client.patch(
+            reverse('user-detail', kwargs={'pk': self.user.pk}),
+            json.dumps({"timezone": "America/Atlantida"}),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FastRepresentationTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(name="Antônio João", weight_grams=72500)
+        User.objects.create(name="Maria José", weight_grams=60000, timezone="America/Sao_Paulo")
+
+        today = timezone.localdate()
+        for offset, quantities in ((0, (250, 120.5)), (1, ()), (120, (300, 2800))):
+            history = History.objects.create(
+                user_id=self.user, goal=self.user.daily_goal, date=today - timezone.timedelta(days=offset)
+            )
+            for quantity in quantities:
+                Intake.objects.create(history_id=history, quantity=quantity)
+
+        call_command('archive_intakes', days=90, stdout=StringIO())
+
+    def test_history_matches_serializer(self):
+        queryset = History.objects.order_by('date')
+
+        self.assertEqual(
+            FastJSONRenderer().render(history_data(history_queryset(queryset))),
+            JSONRenderer().render(HistorySerializer(queryset.with_summary(), many=True).data)
+        )
+
+    def test_users_match_serializer(self):
+        queryset = User.objects.order_by('id')
+
+        self.assertEqual(
+            FastJSONRenderer().render(user_data(queryset.values(*USER_VALUES))),
+            JSONRenderer().render(UserSerializer(queryset, many=True).data)
+        )
+
+    def test_renderer_fallback(self):
+        data = {"total": Decimal("1.50"), "name": "Antônio"}
+
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class SparseFieldsTest(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create(name="Antônio João", weight_grams=75000)
+        history = History.objects.create(user_id=self.user, goal=self.user.daily_goal)
+        Intake.objects.create(history_id=history, quantity=300)
+
+        self.history_url = reverse('user-history', kwargs={'pk': self.user.pk})
+        self.resume_url = reverse('user-resume', kwargs={'pk': self.user.pk})
+
+    def test_history_fields(self):
+        # Usuário e página, sem a consulta dos consumos
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f"{self.history_url}?fields=date,amount_taken,reached_goal")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data['results'][0]), ['date', 'amount_taken', 'reached_goal'])
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('annotated_amount_left', queries[-1]['sql'])
+
+    def test_history_expand_intakes(self):
+        with self.assertNumQueries(3):
+            response = client.get(f"{self.history_url}?fields=date&expand=intakes")
+
+        day = response.data['results'][0]
+        self.assertEqual(list(day), ['date', 'intakes'])
+        self.assertEqual(day['intakes'][0]['quantity'], format_decimal(300))
+
+    def test_resume_fields(self):
+        full = client.get(self.resume_url)
+        response = client.get(f"{self.resume_url}?fields=amount_taken,reached_goal")
+
+        self.assertEqual(response.data, {"amount_taken": format_decimal(300), "reached_goal": False})
+        self.assertNotEqual(response['ETag'], full['ETag'])
+
+    async def test_async_history_fields(self):
+        request = AsyncRequestFactory().get('/', {"fields": "date,amount_taken", "expand": "intakes"})
+        response = await async_views.history(request, pk=self.user.pk)
+        day = json.loads(response.content)['results'][0]
+
+        self.assertEqual(list(day), ['date', 'intakes', 'amount_taken'])
+
+    def test_invalid_params(self):
+        self.assertEqual(client.get(f"{self.history_url}?fields=date,weight").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(client.get(f"{self.resume_url}?expand=user").status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BatchResumeTest(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.users = [
+            User.objects.create(name=f"Usuário {index}", weight_grams=(70 + index) * 1000) for index in range(3)
+        ]
+        self.history = History.objects.create(user_id=self.users[0], goal=self.users[0].daily_goal)
+        Intake.objects.create(history_id=self.history, quantity=300)
+
+        self.url = reverse('user-batch-resume')
+
+    def test_fixed_number_of_queries(self):
+        ids = ",".join(str(user.pk) for user in reversed(self.users))
+
+        # Usuários, dias e consumos, qualquer que seja a quantidade de usuários
+        with self.assertNumQueries(3):
+            response = client.get(f"{self.url}?ids={ids},999999")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result['user'] for result in response.data['results']],
+            [user.pk for user in reversed(self.users)]
+        )
+        self.assertEqual(response.data['not_found'], [999999])
+
+        resume = client.get(reverse('user-resume', kwargs={'pk': self.users[0].pk}))
+        self.assertEqual(response.data['results'][-1]['days'], [resume.data])
+
+    def test_users_without_history(self):
+        response = client.get(f"{self.url}?ids={self.users[1].pk}")
+        day = response.data['results'][0]['days'][0]
+
+        self.assertIsNone(day['id'])
+        self.assertEqual(day['intakes'], [])
+        self.assertEqual(day['goal'], format_decimal(self.users[1].daily_goal))
+        self.assertEqual(day['amount_taken'], format_decimal(0))
+        self.assertFalse(day['reached_goal'])
+
+    def test_date_range_and_fields(self):
+        today = self.history.date
+        since = today - timezone.timedelta(days=2)
+        ids = f"{self.users[0].pk},{self.users[1].pk}"
+
+        with self.assertNumQueries(2):
+            response = client.get(f"{self.url}?ids={ids}&since={since}&until={today}&fields=date,amount_taken")
+
+        days = response.data['results'][0]['days']
+        self.assertEqual([day['date'] for day in days], [str(since + timezone.timedelta(days=n)) for n in range(3)])
+        self.assertEqual([day['amount_taken'] for day in days], [format_decimal(0)] * 2 + [format_decimal(300)])
+        self.assertEqual(list(days[0]), ['date', 'amount_taken'])
+
+    def test_invalid_params(self):
+        pk = self.users[0].pk
+        for query in ("", "ids=a", f"ids={pk}&since=2024-01-10", f"ids={pk}&since=2024-01-10&until=2024-03-10"):
+            self.assertEqual(client.get(f"{self.url}?{query}").status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class IntegerStorageTest(APITestCase):
+    def test_api_format_unchanged(self):
+        response = client.post(
+            reverse('user-list'),
+            json.dumps({"name": "Antônio João", "weight": "72.55"}),
+            content_type='application/json'
+        )
+        user = User.objects.get()
+
+        self.assertEqual(user.weight_grams, 72550)
+        self.assertEqual(response.data['weight'], "72.55")
+        # 72,55KG * 35ML = 2539,25ML, arredondado para o ML mais próximo
+        self.assertEqual(response.json()['daily_goal'], 2539.0)
+
+        response = client.post(
+            reverse('user-drink', kwargs={'pk': user.pk}),
+            json.dumps({"quantity": "250.5"}),
+            content_type='application/json'
+        )
+
+        self.assertEqual(Intake.objects.get().quantity, 251)
+        self.assertEqual(response.data['quantity'], format_decimal(251))
+        self.assertEqual(response.data['resume']['percent_reached'], "9.89")
+
+    def test_formula_expression_matches_compute(self):
+        formula = WeightFormula()
+        weights = [45000, 60000, 72550, 72570, 120990]
+        users = User.objects.bulk_create([User(name="Usuário", weight_grams=weight) for weight in weights])
+
+        goals = User.objects.filter(pk__in=[user.pk for user in users]).annotate(goal=formula.expression())
+
+        self.assertEqual(
+            sorted(goals.values_list('weight_grams', 'goal')),
+            [(weight, formula.compute(weight)) for weight in weights]
+        )
+
+
+class FlatFormula(GoalFormula):
+    """
+    Meta fixa de 2L, usada para testar fórmulas configuráveis
+    """
+
+    def compute(self, weight):
+        return 2000
+
+    def expression(self, weight=None):
+        return Value(2000, output_field=IntegerField())
+
+
+class RecomputeGoalsTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(name="Antônio João", weight_grams=60000)
+        self.today = timezone.localdate()
+
+        self.yesterday = History.objects.create(
+            user_id=self.user, goal=self.user.daily_goal, date=self.today - timezone.timedelta(days=1)
+        )
+        self.history = History.objects.create(user_id=self.user, goal=self.user.daily_goal, date=self.today)
+        Intake.objects.create(history_id=self.history, quantity=700)
+
+    def test_weight_change_updates_today(self):
+        response = client.patch(
+            reverse('user-detail', kwargs={'pk': self.user.pk}),
+            json.dumps({"weight": 80}),
+            content_type='application/json'
+        )
+
+        self.history.refresh_from_db()
+        self.yesterday.refresh_from_db()
+        _, week = period_starts(self.today)[0]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.history.goal, Decimal(2800))
+        self.assertEqual(self.history.progress, 25.0)
+        self.assertEqual(self.yesterday.goal, Decimal(2100))
+        self.assertEqual(Rollup.objects.get(user_id=self.user, period=Rollup.WEEK, start=week).goal, Decimal(2800 * 7))
+
+    @override_settings(TRACKER_GOAL_FORMULA='tracker.tests.FlatFormula')
+    def test_custom_formula(self):
+        out = StringIO()
+        call_command('recompute_goals', all_days=True, stdout=out)
+        call_command('recompute_goals', all_days=True, stdout=out)
+
+        self.assertEqual(self.user.daily_goal, Decimal(2000))
+        self.assertEqual(set(History.objects.values_list('goal', flat=True)), {Decimal(2000)})
+        self.assertEqual(out.getvalue().splitlines(), [
+            "2 meta(s) diária(s) recalculada(s)",
+            "0 meta(s) diária(s) recalculada(s)",
+        ])
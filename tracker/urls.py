@@ -1,7 +1,26 @@
+from django.conf import settings
+from django.urls import path, re_path
 from rest_framework.routers import DefaultRouter
 
-from tracker.views import UserViewSet
+from tracker import async_views
+from tracker.views import UserViewSet, metrics
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='user')
-urlpatterns = router.urls
+urlpatterns = router.urls + [
+    path('metrics/', metrics, name='metrics'),
+]
+
+# Em ASGI, os endpoints mais acessados são atendidos pelas views assíncronas nas mesmas URLs
+async_urlpatterns = [
+    re_path(r'^users/(?P<pk>[^/.]+)/drink/$', async_views.drink, name='user-drink'),
+    re_path(r'^users/(?P<pk>[^/.]+)/resume/$', async_views.resume, name='user-resume'),
+    re_path(r'^users/(?P<pk>[^/.]+)/history/$', async_views.history, name='user-history'),
+    # Em ASGI, um gerador síncrono seria lido inteiro antes do primeiro byte
+    re_path(r'^users/(?P<pk>[^/.]+)/export/$', async_views.export, name='user-export'),
+    # Stream de eventos, apenas em ASGI: em WSGI cada conexão ocuparia uma thread
+    re_path(r'^users/(?P<pk>[^/.]+)/events/$', async_views.events, name='user-events'),
+]
+
+if settings.TRACKER_ASYNC_VIEWS:
+    urlpatterns = async_urlpatterns + urlpatterns
@@ -1,98 +1,581 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.exceptions import NotFound
 from rest_framework.request import Request
 from rest_framework.response import Response
 
+from tracker.buffer import buffer
+from tracker.cache import get_resume, set_resume, make_entry, resume_version, get_user_timezone, set_user_timezone
 from tracker.errors import BadParams
-from tracker.models import User, History
-from tracker.serializers import UserSerializer, IntakeSerializer, HistorySerializer
+from tracker.events import publish_day
+from tracker.export import EXPORT_FORMATS
+from tracker.goals import get_goal_formula
+from tracker.metrics import registry
+from tracker.models import User, History, Rollup, Streak
+from tracker.pagination import HistoryCursorPagination
+from tracker.purge import purge_users
+from tracker.renderers import FastJSONRenderer
+from tracker.representations import (
+    HISTORY_FIELDS,
+    USER_VALUES,
+    decimal_string,
+    empty_day,
+    history_data,
+    history_queryset,
+    project,
+    user_data,
+)
+from tracker.routers import read_from_replica
+from tracker.serializers import (
+    UserSerializer,
+    DrinkSerializer,
+    DayTotalsSerializer,
+    RollupSerializer,
+    RankingSerializer,
+)
+from tracker.stats import SERIES_BUCKETS, intake_series, record_intake, period_starts, recompute_goals
+from tracker.sync import ingest_intakes
+
+
+def parse_date_param(params, name: str):
+    """
+    Converte o parâmetro de data (YYYY-MM-DD) da query. Retorna None caso não exista
+    """
+
+    if param_date := params.get(name, None):
+        try:
+            return datetime.strptime(param_date, "%Y-%m-%d").date()
+        except ValueError:
+            raise BadParams(f"Parâmetro '{name}' inválido")
+
+    return None
+
+
+def parse_summary_params(params) -> tuple:
+    """
+    Lê 'fields' (campos do resumo separados por vírgula) e 'expand' (apenas 'intakes').
+    Sem 'fields' o resumo vem completo, com os consumos; com 'fields' os consumos só vêm
+    com expand=intakes. Retorna (campos ou None, incluir consumos)
+    """
+
+    expand = {item for item in params.get("expand", "").split(",") if item}
+    if expand - {"intakes"}:
+        raise BadParams(f"Parâmetro 'expand' inválido")
+
+    if "fields" not in params:
+        return None, True
+
+    fields = [field for field in params["fields"].split(",") if field]
+    if not fields or set(fields) - set(HISTORY_FIELDS):
+        raise BadParams(f"Parâmetro 'fields' inválido. Campos disponíveis: {', '.join(HISTORY_FIELDS)}")
+
+    return fields, "intakes" in expand
+
+
+def parse_ids_param(params, name: str = "ids") -> list:
+    """
+    Lê ids de usuários separados por vírgula, sem repetições e na ordem informada
+    """
+
+    try:
+        ids = list(dict.fromkeys(int(item) for item in params.get(name, "").split(",") if item))
+    except ValueError:
+        raise BadParams(f"Parâmetro '{name}' inválido")
+
+    if not 1 <= len(ids) <= settings.TRACKER_BATCH_RESUME_MAX_USERS:
+        raise BadParams(f"Parâmetro '{name}' deve ter entre 1 e {settings.TRACKER_BATCH_RESUME_MAX_USERS} ids")
+
+    return ids
+
+
+def export_stream(pk, params) -> tuple:
+    """
+    Monta a exportação a partir dos parâmetros da query. Retorna o formato, o gerador com o
+    conteúdo e o content-type. Nada é lido do banco até o gerador ser percorrido
+    """
+
+    output = params.get("output", "ndjson")
+    if output not in EXPORT_FORMATS:
+        raise BadParams(f"Parâmetro 'output' inválido")
+
+    queryset = History.objects.with_summary().filter(user_id__exact=pk).order_by('date', 'id')
+
+    if since := parse_date_param(params, "since"):
+        queryset = queryset.filter(date__gte=since)
+
+    if until := parse_date_param(params, "until"):
+        queryset = queryset.filter(date__lte=until)
+
+    stream, content_type = EXPORT_FORMATS[output]
+    return output, stream(queryset, params.get("intakes") == "1"), content_type
+
+
+def user_today(pk):
+    """
+    Dia atual no fuso do usuário. O fuso fica em cache para que o resume em cache não consulte o banco
+    """
+
+    if (name := get_user_timezone(pk)) is None:
+        # O cache é compartilhado, então é preenchido pelo banco principal e não por uma réplica atrasada
+        try:
+            with read_from_replica(False):
+                name = User.objects.filter(pk=pk).values_list('timezone', flat=True).first()
+        except ValueError:
+            name = None
+
+        if name is None:
+            raise NotFound()
+
+        set_user_timezone(pk, name)
+
+    return timezone.localdate(timezone=ZoneInfo(name))
 
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    # Ações somente leitura, atendidas pela réplica quando DB_REPLICA_* está configurado
+    replica_actions = {'list', 'resume', 'batch_resume', 'history', 'series'}
+
+    def dispatch(self, request, *args, **kwargs):
+        action = self.action_map.get(request.method.lower())
+        with read_from_replica(action in self.replica_actions):
+            return super().dispatch(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        """
+            Endpoint que lista os usuários. Serializa direto das linhas do banco (tracker.representations)
+        """
+
+        queryset = self.filter_queryset(self.get_queryset()).values(*USER_VALUES)
+        page = self.paginate_queryset(queryset)
+
+        if page is not None:
+            return self.get_paginated_response(user_data(page))
+
+        return Response(user_data(queryset))
+
+    def perform_update(self, serializer):
+        """
+        Com a troca de peso, as metas de hoje e dos dias seguintes acompanham a nova meta diária
+        """
+
+        weight = serializer.instance.weight_grams
+
+        with transaction.atomic():
+            user = serializer.save()
+
+            if user.weight_grams != weight:
+                recompute_goals([user.pk], since=user.local_date())
+
+    def perform_destroy(self, instance):
+        """
+        Remove o usuário e o histórico em lotes, sem carregar todos os dias e consumos em memória
+        """
+
+        purge_users([instance.pk])
 
     def get_or_create_point_in_history(self):
         """
         Caso o dia do histórico exista ele é retornado, caso contrário é criado
+
+        A linha do dia é bloqueada até o fim da transação. Caso outra requisição crie
+        o mesmo dia ao mesmo tempo, get_or_create trata o conflito da chave única
         """
 
         user = self.get_object()
 
-        if history_obj := History.objects.filter(date__exact=timezone.now(), user_id__exact=user.pk).first():
-            obj = history_obj
-        else:
-            obj = History(
-                user_id=user,
-                goal=user.daily_goal
-            )
-            obj.save()
+        obj, _ = History.objects.select_for_update().get_or_create(
+            user_id=user,
+            date=user.local_date(),
+            defaults={'goal': user.daily_goal}
+        )
 
         return obj
 
+    def get_date_param(self, name: str):
+        """
+        Converte o parâmetro de data informado na query. Retorna None caso não exista
+        """
+
+        return parse_date_param(self.request.query_params, name)
+
     @action(detail=True, methods=['POST'])
     def drink(self, request: Request, pk=None):
         """
             Endpoint que registra o consumo de água de um usuário
+
+            Retorna o consumo criado junto com os totais atualizados do dia
         """
 
-        point_in_history = self.get_or_create_point_in_history()
-        intake_serializer = IntakeSerializer(
-            data={
-                **request.data,
-                "history_id": point_in_history.pk
-            }
-        )
+        # Valida antes de tocar no banco
+        intake_serializer = DrinkSerializer(data=request.data)
         intake_serializer.is_valid(raise_exception=True)
-        intake_serializer.save()
 
-        return Response(intake_serializer.data, status=status.HTTP_201_CREATED)
+        if settings.TRACKER_WRITE_BEHIND and (response := self.buffered_drink(intake_serializer)):
+            return response
+
+        with transaction.atomic():
+            point_in_history = self.get_or_create_point_in_history()
+            intake = intake_serializer.save(history_id=point_in_history)
+            record_intake(point_in_history, intake.quantity)
+            publish_day(point_in_history.user_id_id, point_in_history.date)
+
+        # O banco foi atualizado via F() em Intake.save, aqui apenas refletimos na instância
+        point_in_history.amount_taken += intake.quantity
+        point_in_history.intake_count += 1
+
+        return Response(
+            {
+                **intake_serializer.data,
+                "resume": DayTotalsSerializer(point_in_history).data
+            },
+            status=status.HTTP_201_CREATED
+        )
+
+    def buffered_drink(self, intake_serializer: DrinkSerializer):
+        """
+        Enfileira o consumo no write-behind e responde 202 com a chave e os totais previstos do dia.
+        Retorna None caso a fila esteja cheia, para que o consumo seja gravado na hora
+        """
+
+        user = self.get_object()
+        date = user.local_date()
+
+        if not (key := buffer.enqueue(user.pk, date, intake_serializer.validated_data['quantity'])):
+            return None
+
+        return Response(
+            {
+                "key": key,
+                **intake_serializer.data,
+                "resume": DayTotalsSerializer(buffer.day(user, date)).data
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
+    @action(detail=False, methods=['POST'])
+    def sync(self, request: Request):
+        """
+            Endpoint que registra em lote os consumos gravados offline pelos aplicativos
+
+            Espera uma lista de itens com 'key', 'user', 'date' e 'quantity'. A 'key' é
+            gerada pelo cliente e garante que reenviar o mesmo item não o duplique
+        """
+
+        items = request.data
+        if not isinstance(items, list):
+            raise BadParams("Era esperada uma lista de consumos")
+
+        if len(items) > settings.TRACKER_SYNC_MAX_ITEMS:
+            raise BadParams(f"Máximo de {settings.TRACKER_SYNC_MAX_ITEMS} consumos por chamada")
+
+        return Response(ingest_intakes(items), status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['GET'])
     def resume(self, request: Request, pk=None):
         """
             Endpoint que retorna o resumo do dia especificado caso exista
-        """
 
-        # Checa se o usuário existe
-        self.get_object()
+            O resumo fica em cache até a próxima escrita no dia. Requisições com
+            If-None-Match igual ao ETag atual recebem 304 sem consultar o banco
+
+            Aceita 'fields' e 'expand=intakes', recortados do resumo completo em cache
+        """
 
         # Caso o usuário envie uma data como parâmetro da query
-        if param_date := request.query_params.get("date", None):
-            try:
-                date = datetime.strptime(param_date, "%Y-%m-%d").date()
-            except ValueError:
-                raise BadParams(f"Parâmetro 'date' inválido")
+        date = self.get_date_param("date") or user_today(pk)
+        fields, intakes = parse_summary_params(request.query_params)
 
-        else:
-            date = timezone.now()
+        if settings.TRACKER_WRITE_BEHIND and buffer.pending(pk)[1]:
+            # O usuário vê os próprios consumos ainda na fila do write-behind
+            buffer.flush(pk)
 
-        history = History.objects.filter(user_id__exact=pk, date__exact=date).first()
-        if not history:
-            raise NotFound(f"Dia '{date}' não existe no histórico do usuário")
+        if not (entry := get_resume(pk, date)):
+            # A réplica pode ainda não ter o último drink. Como o resumo vai para o cache, que
+            # só é invalidado na escrita, a leitura é feita no banco principal
+            with read_from_replica(False):
+                # Checa se o usuário existe
+                user = self.get_object()
+                version = resume_version(user.pk, date)
 
-        serializer = HistorySerializer(history)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+                queryset = History.objects.filter(user_id__exact=user.pk, date__exact=date)
+                if not (days := history_data(history_queryset(queryset)[:1])):
+                    raise NotFound(f"Dia '{date}' não existe no histórico do usuário")
+
+            entry = set_resume(user.pk, date, days[0], version)
+
+        if fields is not None:
+            entry = make_entry(project(entry["data"], fields, intakes))
+
+        etags = [etag.strip() for etag in request.headers.get("If-None-Match", "").split(",")]
+        if entry["etag"] in etags:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": entry["etag"]})
+
+        return Response(entry["data"], status=status.HTTP_200_OK, headers={"ETag": entry["etag"]})
+
+    @action(detail=False, methods=['GET'], url_path='resume', url_name='batch-resume')
+    def batch_resume(self, request: Request):
+        """
+            Endpoint que retorna o resumo de vários usuários de uma vez, para painéis de equipe
+
+            Parâmetros: 'ids' (separados por vírgula), 'date' ou 'since' e 'until' (padrão: o dia
+            atual de cada usuário), além de 'fields' e 'expand=intakes' como no resume. Dias sem
+            registro vêm com progresso zero. O número de consultas não depende da quantidade de usuários
+        """
+
+        ids = parse_ids_param(request.query_params)
+        fields, intakes = parse_summary_params(request.query_params)
+        dates = self.get_date_range()
+
+        users = {row['id']: row for row in User.objects.filter(pk__in=ids).values('id', 'weight_grams', 'timezone')}
+        days = {
+            pk: dates or [timezone.localdate(timezone=ZoneInfo(user['timezone']))]
+            for pk, user in users.items()
+        }
+
+        wanted = {date for user_dates in days.values() for date in user_dates}
+        queryset = History.objects.filter(user_id__in=users, date__in=wanted)
+        rows = list(history_queryset(queryset, fields, intakes, extra=('user_id',)))
+        history = dict(zip(((row['user_id'], row['date']) for row in rows), history_data(rows, fields, intakes)))
+
+        formula = get_goal_formula()
+        results = []
+        for pk in ids:
+            if pk in users:
+                goal = formula.compute(users[pk]['weight_grams'])
+                results.append({
+                    "user": pk,
+                    "days": [history.get((pk, date)) or empty_day(date, goal, fields, intakes) for date in days[pk]],
+                })
+
+        return Response(
+            {
+                "results": results,
+                "not_found": [pk for pk in ids if pk not in users],
+            },
+            status=status.HTTP_200_OK
+        )
+
+    def get_date_range(self):
+        """
+        Dias pedidos via 'date' ou 'since' e 'until' (inclusivos). Retorna None caso nenhum seja informado
+        """
+
+        if date := self.get_date_param("date"):
+            return [date]
+
+        since, until = self.get_date_param("since"), self.get_date_param("until")
+        if since is None and until is None:
+            return None
+
+        if since is None or until is None or since > until:
+            raise BadParams("Parâmetros 'since' e 'until' devem ser informados juntos, com 'since' até 'until'")
+
+        if (until - since).days >= settings.TRACKER_BATCH_RESUME_MAX_DAYS:
+            raise BadParams(f"Máximo de {settings.TRACKER_BATCH_RESUME_MAX_DAYS} dias por chamada")
+
+        return [since + timedelta(days=offset) for offset in range((until - since).days + 1)]
+
+    @action(detail=True, methods=['GET'])
+    def stats(self, request: Request, pk=None):
+        """
+            Endpoint que retorna as sequências e os consolidados mais recentes do usuário
+
+            Parâmetros: 'period' (week ou month, padrão week) e 'limit' (padrão 12)
+        """
+
+        user = self.get_object()
+
+        period = request.query_params.get("period", Rollup.WEEK)
+        if period not in (Rollup.WEEK, Rollup.MONTH):
+            raise BadParams(f"Parâmetro 'period' inválido")
+
+        try:
+            limit = int(request.query_params.get("limit", 12))
+        except ValueError:
+            raise BadParams(f"Parâmetro 'limit' inválido")
+
+        if not 1 <= limit <= settings.TRACKER_STATS_MAX_LIMIT:
+            raise BadParams(f"Parâmetro 'limit' deve estar entre 1 e {settings.TRACKER_STATS_MAX_LIMIT}")
+
+        rollups = Rollup.objects.filter(user_id=user, period=period).order_by('-start')[:limit]
+        streak = Streak.objects.filter(user_id=user).first() or Streak(user_id=user)
+
+        return Response(
+            {
+                "current_streak": streak.current_on(user.local_date()),
+                "longest_streak": streak.longest,
+                "period": period,
+                "rollups": RollupSerializer(rollups, many=True).data,
+            },
+            status=status.HTTP_200_OK
+        )
 
     @action(detail=True, methods=['GET'])
+    def series(self, request: Request, pk=None):
+        """
+            Endpoint que retorna o total consumido por hora (ou a cada 15 minutos) em um intervalo de dias
+
+            Parâmetros: 'since' e 'until' (padrão: os últimos 7 dias do usuário) e 'bucket'
+            (hour ou 15min). As faixas seguem o fuso do usuário e são agrupadas no banco
+        """
+
+        user = self.get_object()
+
+        bucket = request.query_params.get("bucket", "hour")
+        if bucket not in SERIES_BUCKETS:
+            raise BadParams(f"Parâmetro 'bucket' inválido. Valores aceitos: {', '.join(SERIES_BUCKETS)}")
+
+        until = self.get_date_param("until") or user.local_date()
+        since = self.get_date_param("since") or until - timedelta(days=6)
+        if since > until:
+            raise BadParams("Parâmetro 'since' deve ser anterior a 'until'")
+
+        if (until - since).days >= settings.TRACKER_SERIES_MAX_DAYS:
+            raise BadParams(f"Máximo de {settings.TRACKER_SERIES_MAX_DAYS} dias por chamada")
+
+        return Response(
+            {
+                "bucket": bucket,
+                "timezone": user.timezone,
+                "since": since,
+                "until": until,
+                "results": [
+                    {"start": row["start"], "total": decimal_string(row["total"]), "count": row["count"]}
+                    for row in intake_series(user, since, until, SERIES_BUCKETS[bucket])
+                ],
+            },
+            status=status.HTTP_200_OK
+        )
+
+    @action(detail=False, methods=['GET'])
+    def leaderboard(self, request: Request):
+        """
+            Endpoint que retorna o ranking dos usuários pelo percentual da meta atingido
+
+            Parâmetros: 'period' (day, week ou month, padrão day), 'date' (dia de referência),
+            'limit' (padrão 10) e 'user' (inclui a posição do usuário informado)
+        """
+
+        period = request.query_params.get("period", "day")
+        date = self.get_date_param("date") or timezone.localdate()
+
+        if period == "day":
+            start = date
+            queryset = History.objects.filter(date=date)
+        elif period in (Rollup.WEEK, Rollup.MONTH):
+            start = dict(period_starts(date))[period]
+            queryset = Rollup.objects.filter(period=period, start=start)
+        else:
+            raise BadParams(f"Parâmetro 'period' inválido")
+
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            raise BadParams(f"Parâmetro 'limit' inválido")
+
+        if not 1 <= limit <= settings.TRACKER_LEADERBOARD_MAX_LIMIT:
+            raise BadParams(f"Parâmetro 'limit' deve estar entre 1 e {settings.TRACKER_LEADERBOARD_MAX_LIMIT}")
+
+        # O índice por progresso permite ler o topo sem ordenar a tabela
+        rows = queryset.order_by('-progress', 'user_id').values_list('user_id', 'user_id__name', 'progress')[:limit]
+
+        top = []
+        for position, (user_id, name, progress) in enumerate(rows, start=1):
+            # Empates dividem a mesma posição
+            rank = top[-1]["rank"] if top and top[-1]["percent"] == progress else position
+            top.append({"rank": rank, "user": user_id, "name": name, "percent": progress})
+
+        response = {
+            "period": period,
+            "start": start,
+            "top": RankingSerializer(top, many=True).data,
+        }
+
+        if user := request.query_params.get("user"):
+            if not user.isdigit():
+                raise BadParams(f"Parâmetro 'user' inválido")
+
+            entry = queryset.filter(user_id=user).values_list('user_id', 'user_id__name', 'progress').first()
+            if not entry:
+                raise NotFound(f"Usuário '{user}' não possui registro no período")
+
+            user_id, name, progress = entry
+            response["user"] = RankingSerializer({
+                "rank": queryset.filter(progress__gt=progress).count() + 1,
+                "user": user_id,
+                "name": name,
+                "percent": progress,
+            }).data
+
+        return Response(response, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['GET'], pagination_class=HistoryCursorPagination)
     def history(self, request: Request, pk=None):
         """
             Endpoint que retorna o histórico do usuário de forma paginada
+
+            Aceita os filtros 'since' e 'until' (inclusivos) no formato YYYY-MM-DD, além de
+            'fields' e 'expand=intakes'. Campos não pedidos não são calculados no SQL
         """
 
         # Checa se o usuário existe
         self.get_object()
 
+        fields, intakes = parse_summary_params(request.query_params)
         queryset = History.objects.filter(user_id__exact=pk)
-        page = self.paginate_queryset(queryset)
+
+        if since := self.get_date_param("since"):
+            queryset = queryset.filter(date__gte=since)
+
+        if until := self.get_date_param("until"):
+            queryset = queryset.filter(date__lte=until)
+
+        rows = history_queryset(queryset, fields, intakes)
+        page = self.paginate_queryset(rows)
 
         if page is not None:
-            serializer = HistorySerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            return self.get_paginated_response(history_data(page, fields, intakes))
+
+        return Response(history_data(rows, fields, intakes))
+
+    @action(detail=True, methods=['GET'])
+    def export(self, request: Request, pk=None):
+        """
+            Endpoint que exporta o histórico completo do usuário em streaming
+
+            Parâmetros: 'output' (ndjson ou csv, padrão ndjson), 'intakes' (1 para incluir
+            os consumos de cada dia), além dos filtros 'since' e 'until'. Em ASGI é atendido
+            por async_views.export, que não lê a exportação inteira antes do primeiro byte
+        """
+
+        # Checa se o usuário existe
+        self.get_object()
+
+        output, content, content_type = export_stream(pk, request.query_params)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="history-{pk}.{output}"'
+
+        return response
+
+
+def metrics(request):
+    """
+        Histogramas por rota coletados pelo RequestMetricsMiddleware, no formato texto do Prometheus
+    """
+
+    if not settings.TRACKER_REQUEST_METRICS:
+        raise Http404()
 
-        serializer = HistorySerializer(queryset, many=True)
-        return Response(serializer.data)
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
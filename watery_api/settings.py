@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 from rest_framework.permissions import AllowAny
@@ -47,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tracker.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,10 +82,69 @@ WSGI_APPLICATION = 'watery_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Configurado por variáveis de ambiente com prefixo DB_ (ENGINE, NAME, USER, PASSWORD, HOST,
+# PORT, CONN_MAX_AGE). Sem elas, usa o SQLite local ajustado para escritas concorrentes
+
+SQLITE_ENGINE = 'tracker.backends.sqlite3'
+
+
+def database_from_env(prefix: str, fallback: dict = None) -> dict:
+    fallback = fallback or {
+        'ENGINE': SQLITE_ENGINE,
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'USER': '',
+        'PASSWORD': '',
+        'HOST': '',
+        'PORT': '',
+        'CONN_MAX_AGE': 60,
+    }
+
+    database = {
+        key: os.environ.get(f'{prefix}_{key}', default) for key, default in fallback.items()
+        if key in ('ENGINE', 'NAME', 'USER', 'PASSWORD', 'HOST', 'PORT')
+    }
+    # Conexões persistentes, verificadas antes de serem reaproveitadas por uma nova requisição
+    database['CONN_MAX_AGE'] = int(os.environ.get(f'{prefix}_CONN_MAX_AGE', fallback['CONN_MAX_AGE']))
+    database['CONN_HEALTH_CHECKS'] = True
+
+    if database['ENGINE'] == SQLITE_ENGINE:
+        database['OPTIONS'] = {
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': int(os.environ.get('DB_SQLITE_BUSY_TIMEOUT', 5000)),
+                'mmap_size': int(os.environ.get('DB_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+            },
+        }
+        # Banco de testes em arquivo, para que as threads dos testes de concorrência usem conexões próprias
+        database['TEST'] = {'NAME': os.environ.get(f'{prefix}_TEST_NAME', BASE_DIR / 'test-db.sqlite3')}
+
+    return database
+
+
 DATABASES = {
+    'default': database_from_env('DB'),
+}
+
+# Réplica somente leitura, usada por history, pelos resumos em lote e pela listagem de usuários.
+# O resume de um dia lê do principal, pois o resultado vai para o cache
+if os.environ.get('DB_REPLICA_NAME') or os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **database_from_env('DB_REPLICA', DATABASES['default']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['tracker.routers.ReplicaRouter']
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Com vários workers, configure um backend compartilhado (ex.: django.core.cache.backends.redis.RedisCache
+# e CACHE_LOCATION=redis://...). O LocMemCache é de cada processo: uma escrita só invalidaria o cache do
+# próprio worker e os demais continuariam servindo o resumo anterior
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
@@ -131,3 +192,67 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
 }
+
+# Tracker
+
+# Tamanho padrão e máximo (via ?page_size=) das páginas do histórico
+TRACKER_HISTORY_PAGE_SIZE = 30
+TRACKER_HISTORY_MAX_PAGE_SIZE = 366
+
+# Quantidade máxima de consumos aceitos por chamada de sincronização
+TRACKER_SYNC_MAX_ITEMS = 5000
+
+# Tempo máximo (segundos) que o resumo do dia fica no cache. Escritas invalidam antes disso
+TRACKER_RESUME_CACHE_TIMEOUT = 300
+
+# Atende drink, resume e history com views assíncronas. Ligado por padrão em watery_api.asgi
+TRACKER_ASYNC_VIEWS = os.environ.get('TRACKER_ASYNC_VIEWS', '0') == '1'
+
+# Quantidade máxima de consolidados retornados por /stats/
+TRACKER_STATS_MAX_LIMIT = 120
+
+# Quantidade máxima de usuários retornados no topo do /leaderboard/
+TRACKER_LEADERBOARD_MAX_LIMIT = 100
+
+# Quantidade máxima de usuários e de dias por chamada do resumo em lote (/users/resume/)
+TRACKER_BATCH_RESUME_MAX_USERS = 500
+TRACKER_BATCH_RESUME_MAX_DAYS = 31
+
+# Quantidade máxima de dias por chamada da série temporal dos consumos (/series/)
+TRACKER_SERIES_MAX_DAYS = 366
+
+# Dias em que os consumos ficam em Intake antes de serem compactados por archive_intakes
+TRACKER_INTAKE_RETENTION_DAYS = 90
+
+# Mede consultas e tempos de cada requisição (Server-Timing, log e /metrics/). Sem custo quando desligado
+TRACKER_REQUEST_METRICS = os.environ.get('TRACKER_REQUEST_METRICS', '0') == '1'
+
+# Fuso atribuído aos usuários que não informam o seu. Define em que dia cada consumo é registrado
+TRACKER_DEFAULT_USER_TIMEZONE = os.environ.get('TRACKER_DEFAULT_USER_TIMEZONE', TIME_ZONE)
+
+# Tempo máximo (segundos) que o fuso do usuário fica no cache. A troca de fuso o invalida, mas com
+# um cache por processo (LocMemCache) os demais workers só veem o novo fuso após esse prazo
+TRACKER_USER_TIMEZONE_CACHE_TIMEOUT = 60
+
+# Fórmula da meta diária (subclasse de tracker.goals.GoalFormula). Após trocá-la, rode recompute_goals
+TRACKER_GOAL_FORMULA = 'tracker.goals.WeightFormula'
+
+# Modo write-behind do drink: responde 202 e grava os consumos em lotes em segundo plano (tracker.buffer)
+TRACKER_WRITE_BEHIND = os.environ.get('TRACKER_WRITE_BEHIND', '0') == '1'
+
+# Consumos pendentes na fila do write-behind. Com a fila cheia o drink grava na hora
+TRACKER_WRITE_BEHIND_MAX_PENDING = 10000
+
+# Consumos gravados por transação e intervalo máximo (segundos) entre gravações no write-behind
+TRACKER_WRITE_BEHIND_BATCH_SIZE = 500
+TRACKER_WRITE_BEHIND_INTERVAL = 0.2
+
+# Broker do stream de eventos (subclasse de tracker.events.Broker). LocalBroker distribui dentro do processo
+TRACKER_EVENT_BROKER = 'tracker.events.LocalBroker'
+
+# Stream de eventos: intervalo do keepalive e duração máxima da conexão (segundos), espera
+# do cliente antes de reconectar (milissegundos) e resumos guardados por conexão lenta
+TRACKER_EVENTS_KEEPALIVE = 15
+TRACKER_EVENTS_MAX_AGE = 300
+TRACKER_EVENTS_RETRY = 3000
+TRACKER_EVENTS_BACKLOG = 16